@@ -1,7 +1,9 @@
 import customtkinter as ctk
 from tkinter import filedialog, Canvas
-from PIL import Image, ImageTk
 import os
+from canvas_renderer import TiledRenderer
+from page_cache import PageCache
+from crop_export import ExportQueue
 
 class ManhwaCropper(ctk.CTk):
     def __init__(self):
@@ -24,6 +26,9 @@ class ManhwaCropper(ctk.CTk):
         self.zoom_level = 1.0
         self.image_x, self.image_y = 0, 0
         self.pan_start_x, self.pan_start_y = 0, 0
+        self.page_cache = PageCache() # Decodes neighbouring pages in the background
+        self.export_queue = ExportQueue() # Encodes and writes crops off the UI thread
+        self.export_queue.attach(self, lambda *state: self.status_label.configure(text=ExportQueue.status_text(*state)))
 
         # ---- UI Widgets ----
         # --- MODIFIED: Grid layout to accommodate sliders ---
@@ -51,6 +56,7 @@ class ManhwaCropper(ctk.CTk):
 
         self.canvas = Canvas(self, bg="gray20", highlightthickness=0)
         self.canvas.grid(row=1, column=0, sticky="nsew")
+        self.renderer = TiledRenderer(self.canvas) # Only resamples the visible part of the page
 
         # --- NEW: Pan Sliders ---
         self.y_slider = ctk.CTkSlider(self, orientation="vertical", command=self.on_y_slider_move)
@@ -76,6 +82,7 @@ class ManhwaCropper(ctk.CTk):
         self.canvas.bind("<ButtonPress-2>", self.on_pan_start)
         self.canvas.bind("<B2-Motion>", self.on_pan_drag)
         self.canvas.bind("<Configure>", self.on_canvas_resize) # Update on resize
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     # --- NEW: Slider control functions ---
     def on_x_slider_move(self, value):
@@ -129,26 +136,32 @@ class ManhwaCropper(ctk.CTk):
     def redraw_canvas(self):
         """Redraws the image and all saved selections, then updates sliders."""
         if not self.original_pil_image: return
-        self.canvas.delete("all")
-        
-        img_width, img_height = self.original_pil_image.size
-        new_width = int(img_width * self.zoom_level)
-        new_height = int(img_height * self.zoom_level)
-        
-        resized_image = self.original_pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        self.display_image_tk = ImageTk.PhotoImage(resized_image)
-        self.canvas.create_image(self.image_x, self.image_y, anchor="nw", image=self.display_image_tk)
+        # --- MODIFIED: Draw only the visible tiles instead of resizing the whole page ---
+        self.renderer.render(self.original_pil_image, self.zoom_level, self.image_x, self.image_y)
         
+        # --- MODIFIED: Boxes live in image space and are re-projected after every pan or zoom ---
         for selection in self.selections:
-            self.canvas.coords(selection['id'], *selection['coords'])
+            self.canvas.coords(selection['id'], *self.image_to_canvas(selection['image_coords']))
         
         # --- MODIFIED: Always update sliders after a redraw ---
         self.update_sliders()
 
+    def image_to_canvas(self, coords):
+        x1, y1, x2, y2 = coords
+        return (x1 * self.zoom_level + self.image_x, y1 * self.zoom_level + self.image_y,
+                x2 * self.zoom_level + self.image_x, y2 * self.zoom_level + self.image_y)
+
+    def canvas_to_image(self, coords):
+        x1, y1, x2, y2 = coords
+        return ((min(x1, x2) - self.image_x) / self.zoom_level, (min(y1, y2) - self.image_y) / self.zoom_level,
+                (max(x1, x2) - self.image_x) / self.zoom_level, (max(y1, y2) - self.image_y) / self.zoom_level)
+
     # --- No significant changes to functions below this line, only minor adjustments ---
     def load_and_fit_image(self):
         image_path = self.image_paths[self.current_image_index]
-        self.original_pil_image = Image.open(image_path)
+        self.original_pil_image = self.page_cache.get(image_path)
+        self.page_cache.prefetch(self.image_paths, self.current_image_index)
+        self.renderer.set_image(self.original_pil_image) # Builds the zoom pyramid once per page
         self.after(50, self._fit_image_to_canvas)
 
     def _fit_image_to_canvas(self):
@@ -170,6 +183,7 @@ class ManhwaCropper(ctk.CTk):
         if event.num == 5 or event.delta == -120: self.zoom_level /= zoom_factor
         if event.num == 4 or event.delta == 120: self.zoom_level *= zoom_factor
         self.zoom_level = max(0.1, self.zoom_level)
+        self.renderer.zooming()
         self.redraw_canvas()
 
     def on_pan_start(self, event):
@@ -186,7 +200,7 @@ class ManhwaCropper(ctk.CTk):
     def on_mouse_release(self, event):
         if self.current_rect_id:
             coords = (self.crop_start_x, self.crop_start_y, event.x, event.y)
-            self.selections.append({'id': self.current_rect_id, 'coords': coords})
+            self.selections.append({'id': self.current_rect_id, 'image_coords': self.canvas_to_image(coords)})
             self.current_rect_id = None
             self.status_label.configure(text=f"{len(self.selections)} region(s) selected. Press 's' to save.")
 
@@ -196,20 +210,23 @@ class ManhwaCropper(ctk.CTk):
             return
         if not self.output_directory and not self.prompt_for_output_directory():
             return
-        saved_count = 0
+        queued_count = 0
         for selection in self.selections:
-            coords = selection['coords']
-            x1 = (min(coords[0], coords[2]) - self.image_x) / self.zoom_level
-            y1 = (min(coords[1], coords[3]) - self.image_y) / self.zoom_level
-            x2 = (max(coords[0], coords[2]) - self.image_x) / self.zoom_level
-            y2 = (max(coords[1], coords[3]) - self.image_y) / self.zoom_level
-            cropped_image = self.original_pil_image.crop((x1, y1, x2, y2))
+            x1, y1, x2, y2 = selection['image_coords']
             save_path = os.path.join(self.output_directory, f"panel_{self.crop_counter:03d}.png")
-            cropped_image.save(save_path, "PNG")
+            # --- MODIFIED: Crop and encode in the background, numbering is fixed here ---
+            self.export_queue.submit(self.original_pil_image, (x1, y1, x2, y2), save_path)
             self.crop_counter += 1
-            saved_count += 1
-        self.status_label.configure(text=f"Saved {saved_count} panels!")
+            queued_count += 1
+        self.status_label.configure(text=f"Saving {queued_count} panels...")
         self.clear_selections(update_status=False)
+        self.export_queue.watch()
+
+    def on_close(self):
+        """Makes sure every queued panel is on disk before the window goes away."""
+        self.export_queue.close() # Shows the pending count and waits for the last panels
+        self.page_cache.shutdown()
+        self.destroy()
 
     def clear_selections(self, update_status=True):
         for selection in self.selections:
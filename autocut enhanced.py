@@ -1,10 +1,11 @@
 import customtkinter as ctk
 from tkinter import filedialog, Canvas
-from PIL import Image, ImageTk
 import os
-import cv2  # OpenCV for image processing
-import numpy as np  # NumPy for numerical operations
-import copy  # For deep copying states for undo/redo
+from canvas_renderer import TiledRenderer  # Viewport-only rendering
+from page_cache import PageCache  # Background decoding of neighbouring pages
+from crop_export import ExportQueue  # Background crop encoding
+from panel_detection import detect, AUTOCUT_PARAMS  # Shared GUI-free detector
+from edit_history import EditHistory  # Undo steps hold only the changed boxes
 
 class ManhwaCropper(ctk.CTk):
     def __init__(self):
@@ -27,10 +28,12 @@ class ManhwaCropper(ctk.CTk):
         self.zoom_level = 1.0
         self.image_x, self.image_y = 0, 0
         self.pan_start_x, self.pan_start_y = 0, 0
+        self.page_cache = PageCache()
+        self.export_queue = ExportQueue()
+        self.export_queue.attach(self, lambda *state: self.status_label.configure(text=ExportQueue.status_text(*state)))
 
         # Undo/Redo State
-        self.undo_stack = []
-        self.redo_stack = []
+        self.history = EditHistory() # Boxes are kept in image space under 'image_coords'
 
         # ---- UI Widgets ----
         self.grid_columnconfigure(0, weight=1)
@@ -63,6 +66,7 @@ class ManhwaCropper(ctk.CTk):
 
         self.canvas = Canvas(self, bg="gray20", highlightthickness=0)
         self.canvas.grid(row=1, column=0, sticky="nsew")
+        self.renderer = TiledRenderer(self.canvas)
         self.y_slider = ctk.CTkSlider(self, orientation="vertical", command=self.on_y_slider_move)
         self.y_slider.grid(row=1, column=1, sticky="ns")
         self.x_slider = ctk.CTkSlider(self, orientation="horizontal", command=self.on_x_slider_move)
@@ -86,32 +90,26 @@ class ManhwaCropper(ctk.CTk):
         self.canvas.bind("<ButtonPress-2>", self.on_pan_start)
         self.canvas.bind("<B2-Motion>", self.on_pan_drag)
         self.canvas.bind("<Configure>", self.on_canvas_resize)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     # --- UNDO/REDO LOGIC ---
     def save_state_for_undo(self):
-        self.undo_stack.append(copy.deepcopy(self.selections))
-        self.redo_stack.clear()
+        self.history.checkpoint(self.selections)
         self.update_undo_redo_buttons()
 
     def undo_action(self):
-        if not self.undo_stack: return
-        self.redo_stack.append(copy.deepcopy(self.selections))
-        last_state = self.undo_stack.pop()
-        self.selections = last_state
+        if self.history.undo(self.selections) is None: return
         self.redraw_canvas()
         self.update_undo_redo_buttons()
 
     def redo_action(self):
-        if not self.redo_stack: return
-        self.undo_stack.append(copy.deepcopy(self.selections))
-        next_state = self.redo_stack.pop()
-        self.selections = next_state
+        if self.history.redo(self.selections) is None: return
         self.redraw_canvas()
         self.update_undo_redo_buttons()
 
     def update_undo_redo_buttons(self):
-        self.undo_button.configure(state="normal" if self.undo_stack else "disabled")
-        self.redo_button.configure(state="normal" if self.redo_stack else "disabled")
+        self.undo_button.configure(state="normal" if self.history.can_undo(self.selections) else "disabled")
+        self.redo_button.configure(state="normal" if self.history.can_redo() else "disabled")
 
     # --- AUTO-DETECT LOGIC ---
     def run_auto_detect(self):
@@ -122,30 +120,24 @@ class ManhwaCropper(ctk.CTk):
         self.clear_selections(update_status=False, save_state=False)
         self.status_label.configure(text="Detecting panels...")
         self.update()
-        open_cv_image = cv2.cvtColor(np.array(self.original_pil_image), cv2.COLOR_RGB2BGR)
-        gray = cv2.cvtColor(open_cv_image, cv2.COLOR_BGR2GRAY)
-        _, thresh = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY)
-        thresh_inv = cv2.bitwise_not(thresh)
-        contours, _ = cv2.findContours(thresh_inv, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        detected_boxes = []
-        img_area = self.original_pil_image.size[0] * self.original_pil_image.size[1]
-        for cnt in contours:
-            if cv2.contourArea(cnt) > img_area * 0.001:
-                x, y, w, h = cv2.boundingRect(cnt)
-                detected_boxes.append((x, y, x + w, y + h))
-        detected_boxes.sort(key=lambda b: (b[1], b[0]))
+        detected_boxes = detect(self.original_pil_image, AUTOCUT_PARAMS)
         for box in detected_boxes:
-            x1, y1, x2, y2 = box
-            canvas_x1 = (x1 * self.zoom_level) + self.image_x
-            canvas_y1 = (y1 * self.zoom_level) + self.image_y
-            canvas_x2 = (x2 * self.zoom_level) + self.image_x
-            canvas_y2 = (y2 * self.zoom_level) + self.image_y
-            rect_id = self.canvas.create_rectangle(canvas_x1, canvas_y1, canvas_x2, canvas_y2, outline="red", width=2)
-            self.selections.append({'id': rect_id, 'coords': (canvas_x1, canvas_y1, canvas_x2, canvas_y2)})
+            rect_id = self.canvas.create_rectangle(*self.image_to_canvas(box), outline="red", width=2)
+            self.selections.append({'id': rect_id, 'image_coords': tuple(box)})
         self.status_label.configure(text=f"Detected {len(self.selections)} panels.")
         self.update_undo_redo_buttons()
     
     # --- ALL OTHER METHODS ---
+    def image_to_canvas(self, coords):
+        x1, y1, x2, y2 = coords
+        return (x1 * self.zoom_level + self.image_x, y1 * self.zoom_level + self.image_y,
+                x2 * self.zoom_level + self.image_x, y2 * self.zoom_level + self.image_y)
+
+    def canvas_to_image(self, coords):
+        x1, y1, x2, y2 = coords
+        return ((min(x1, x2) - self.image_x) / self.zoom_level, (min(y1, y2) - self.image_y) / self.zoom_level,
+                (max(x1, x2) - self.image_x) / self.zoom_level, (max(y1, y2) - self.image_y) / self.zoom_level)
+
     def on_x_slider_move(self, value):
         self.image_x = value
         self.redraw_canvas()
@@ -193,6 +185,7 @@ class ManhwaCropper(ctk.CTk):
         if event.num == 5 or event.delta == -120: self.zoom_level /= zoom_factor
         if event.num == 4 or event.delta == 120: self.zoom_level *= zoom_factor
         self.zoom_level = max(0.1, self.zoom_level)
+        self.renderer.zooming()
         self.redraw_canvas()
 
     def on_mouse_press(self, event):
@@ -207,22 +200,17 @@ class ManhwaCropper(ctk.CTk):
         if self.current_rect_id:
             self.save_state_for_undo()
             coords = (self.crop_start_x, self.crop_start_y, event.x, event.y)
-            self.selections.append({'id': self.current_rect_id, 'coords': coords})
+            self.selections.append({'id': self.current_rect_id, 'image_coords': self.canvas_to_image(coords)})
             self.current_rect_id = None
             self.status_label.configure(text=f"{len(self.selections)} region(s) selected.")
             self.update_undo_redo_buttons()
 
     def redraw_canvas(self):
         if not self.original_pil_image: return
-        self.canvas.delete("all")
-        img_width, img_height = self.original_pil_image.size
-        new_width = int(img_width * self.zoom_level)
-        new_height = int(img_height * self.zoom_level)
-        resized_image = self.original_pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        self.display_image_tk = ImageTk.PhotoImage(resized_image)
-        self.canvas.create_image(self.image_x, self.image_y, anchor="nw", image=self.display_image_tk)
+        self.canvas.delete("!image") # Keep the cached image tiles, drop everything else
+        self.renderer.render(self.original_pil_image, self.zoom_level, self.image_x, self.image_y)
         for selection in self.selections:
-            rect_id = self.canvas.create_rectangle(*selection['coords'], outline="red", width=2)
+            rect_id = self.canvas.create_rectangle(*self.image_to_canvas(selection['image_coords']), outline="red", width=2)
             selection['id'] = rect_id
         self.update_sliders()
 
@@ -242,20 +230,22 @@ class ManhwaCropper(ctk.CTk):
             return
         if not self.output_directory and not self.prompt_for_output_directory():
             return
-        saved_count = 0
+        queued_count = 0
         for selection in self.selections:
-            coords = selection['coords']
-            x1 = (min(coords[0], coords[2]) - self.image_x) / self.zoom_level
-            y1 = (min(coords[1], coords[3]) - self.image_y) / self.zoom_level
-            x2 = (max(coords[0], coords[2]) - self.image_x) / self.zoom_level
-            y2 = (max(coords[1], coords[3]) - self.image_y) / self.zoom_level
-            cropped_image = self.original_pil_image.crop((x1, y1, x2, y2))
+            x1, y1, x2, y2 = selection['image_coords']
             save_path = os.path.join(self.output_directory, f"panel_{self.crop_counter:03d}.png")
-            cropped_image.save(save_path, "PNG")
+            self.export_queue.submit(self.original_pil_image, (x1, y1, x2, y2), save_path)
             self.crop_counter += 1
-            saved_count += 1
-        self.status_label.configure(text=f"Saved {saved_count} panels!")
+            queued_count += 1
+        self.status_label.configure(text=f"Saving {queued_count} panels...")
         self.clear_selections(update_status=False, save_state=True)
+        self.export_queue.watch()
+
+    def on_close(self):
+        """Makes sure every queued panel is on disk before the window goes away."""
+        self.export_queue.close() # Shows the pending count and waits for the last panels
+        self.page_cache.shutdown()
+        self.destroy()
 
     def prompt_for_output_directory(self):
         path = filedialog.askdirectory(title="Select Output Folder")
@@ -278,7 +268,9 @@ class ManhwaCropper(ctk.CTk):
 
     def load_and_fit_image(self):
         image_path = self.image_paths[self.current_image_index]
-        self.original_pil_image = Image.open(image_path)
+        self.original_pil_image = self.page_cache.get(image_path)
+        self.page_cache.prefetch(self.image_paths, self.current_image_index)
+        self.renderer.set_image(self.original_pil_image)
         self.after(50, self._fit_image_to_canvas)
 
     def _fit_image_to_canvas(self):
@@ -298,8 +290,7 @@ class ManhwaCropper(ctk.CTk):
     def next_image(self):
         if self.current_image_index < len(self.image_paths) - 1:
             self.clear_selections(update_status=False, save_state=False)
-            self.undo_stack.clear()
-            self.redo_stack.clear()
+            self.history.clear()
             self.update_undo_redo_buttons()
             self.current_image_index += 1
             self.load_and_fit_image()
@@ -308,8 +299,7 @@ class ManhwaCropper(ctk.CTk):
     def prev_image(self):
         if self.current_image_index > 0:
             self.clear_selections(update_status=False, save_state=False)
-            self.undo_stack.clear()
-            self.redo_stack.clear()
+            self.history.clear()
             self.update_undo_redo_buttons()
             self.current_image_index -= 1
             self.load_and_fit_image()
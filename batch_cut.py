@@ -0,0 +1,166 @@
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image
+
+from panel_detection import DetectionParams, detect
+from crop_export import EXPORT_PROFILES, DEFAULT_EXPORT_PROFILE
+from strip_reader import StripReader, detect_strip_panels, write_strip_crops
+from detection_store import DetectionStore, DEFAULT_STORE_PATH
+from content_hash import file_digest
+
+# --- Headless chapter cutter ---
+# Same detection and export as the cropper windows, without Tk, for render boxes and cron jobs:
+#   python batch_cut.py chapter_012/ -o out/chapter_012
+#   python batch_cut.py "raw/ch12_*.png" -o out/ch12 --closing-kernel 5 --format "WebP (lossless)"
+# Exit status is 0 when every page was detected and every panel written, 1 otherwise.
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".tif", ".tiff")
+ENGINES = {"contours": {'engine': "contours", 'coarse_scale': 1.0},
+           "coarse": {'engine': "contours", 'coarse_scale': 0.25},
+           "gutters": {'engine': "gutters"}}
+
+def find_pages(source):
+    """Pages of a chapter directory, or of a glob pattern, in the same order the GUIs load them."""
+    if os.path.isdir(source):
+        paths = [os.path.join(source, f) for f in os.listdir(source)]
+    else:
+        paths = glob.glob(source)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+def _is_tall_strip(path, stream_above, params):
+    # Only the contour engine can run band by band.
+    if not stream_above or params.engine != "contours" or params.coarse_scale < 1.0: return False
+    return StripReader(path).height > stream_above
+
+# --- Workers (run in child processes) ---
+def _detect_page(path, params, stream_above):
+    if _is_tall_strip(path, stream_above, params):
+        return detect_strip_panels(path, params)
+    with Image.open(path) as image:
+        return detect(image.convert("RGB"), params)
+
+def _export_page(path, boxes, save_paths, profile, stream_above, params):
+    if _is_tall_strip(path, stream_above, params):
+        return write_strip_crops(path, boxes, save_paths, profile)
+    with Image.open(path) as image:
+        page = image.convert("RGB")
+    for box, save_path in zip(boxes, save_paths):
+        profile.save(page.crop(box), save_path)
+    return save_paths
+
+def _run_pool(executor, jobs, label, log):
+    """Submits {key: (fn, args)} and returns ({key: result}, {key: error message}) as jobs finish."""
+    futures = {executor.submit(fn, *args): key for key, (fn, args) in jobs.items()}
+    results, errors = {}, {}
+    for done, future in enumerate(as_completed(futures), 1):
+        key = futures[future]
+        try:
+            results[key] = future.result()
+            log(f"[{label} {done}/{len(futures)}] {os.path.basename(key)}")
+        except Exception as e:
+            errors[key] = str(e)
+            log(f"[{label} {done}/{len(futures)}] {os.path.basename(key)} FAILED: {e}")
+    return results, errors
+
+def cut_chapter(pages, output_directory, params, profile, workers=None, first_counter=1, stream_above=20000, store=None, log=print):
+    """
+    Detects every page on a process pool, numbers the panels in page order, then writes the crops
+    on the same pool. Pages already in `store` (a DetectionStore) skip detection.
+    Returns the manifest dict; manifest["failures"] counts failed pages.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    boxes, digests, streamed = {}, {}, {}
+    for page in pages if store is not None else []:
+        try:
+            digests[page] = file_digest(page)
+            streamed[page] = _is_tall_strip(page, stream_above, params)
+        except (OSError, struct.error):
+            digests.pop(page, None)
+            continue  # Reported by the detection worker.
+        cached = store.lookup(digests[page], params, bands=streamed[page])
+        if cached is not None: boxes[page] = cached
+    if boxes: log(f"{len(boxes)} of {len(pages)} pages unchanged, taken from the detection cache")
+
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, max(len(pages), 1))) as executor:
+        jobs = {p: (_detect_page, (p, params, stream_above)) for p in pages if p not in boxes}
+        detected, errors = _run_pool(executor, jobs, "detect", log)
+        for page, page_boxes in detected.items():
+            boxes[page] = page_boxes
+            if page in digests: store.store(digests[page], params, page_boxes, bands=streamed[page])
+
+        # Numbers are handed out in page order, before any worker writes, like save_current_page_crops.
+        counter = first_counter
+        save_paths = {}
+        for page in pages:
+            save_paths[page] = [os.path.join(output_directory, profile.filename(counter + i)) for i in range(len(boxes.get(page, [])))]
+            counter += len(save_paths[page])
+        jobs = {p: (_export_page, (p, boxes[p], save_paths[p], profile, stream_above, params)) for p in pages if boxes.get(p)}
+        _, export_errors = _run_pool(executor, jobs, "export", log)
+    errors.update(export_errors)
+
+    manifest = {'output_directory': os.path.abspath(output_directory), 'params': params.to_dict(),
+                'format': profile.format, 'max_height': profile.max_height, 'pages': [], 'failures': len(errors)}
+    for page in pages:
+        manifest['pages'].append({'path': os.path.abspath(page),
+                                  'boxes': [list(map(int, box)) for box in boxes.get(page, [])],
+                                  'panels': [os.path.basename(p) for p in save_paths[page]],
+                                  'error': errors.get(page)})
+    return manifest
+
+def parse_args(argv=None):
+    defaults = DetectionParams()
+    parser = argparse.ArgumentParser(description="Cut manhwa pages into panel_NNN images without a display.")
+    parser.add_argument("source", help="chapter directory, or a quoted glob such as 'raw/ch12_*.png'")
+    parser.add_argument("-o", "--output", required=True, help="output directory for panels and manifest.json")
+    parser.add_argument("--min-area", type=float, default=defaults.min_area_perc, help="minimum panel area, %% of the page (default %(default)s)")
+    parser.add_argument("--min-solidity", type=float, default=defaults.min_solidity, help="minimum contour solidity, 0-1 (default %(default)s)")
+    parser.add_argument("--closing-kernel", type=int, default=defaults.closing_kernel_size, help="closing kernel size, 1 = off (default %(default)s)")
+    parser.add_argument("--max-aspect", type=float, default=defaults.max_aspect_ratio, help="maximum aspect ratio, 0 = off (default %(default)s)")
+    parser.add_argument("--engine", choices=list(ENGINES), default="contours", help="detection engine (default %(default)s)")
+    parser.add_argument("--format", choices=list(EXPORT_PROFILES), default=DEFAULT_EXPORT_PROFILE, help="export profile (default %(default)s)")
+    parser.add_argument("--max-height", type=int, default=0, help="downscale panels taller than this, 0 = off")
+    parser.add_argument("--start", type=int, default=1, help="number of the first panel (default %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--stream-above", type=int, default=20000, help="pages taller than this many rows are read band by band, 0 = never (default %(default)s)")
+    parser.add_argument("--cache", default=DEFAULT_STORE_PATH, help="detection cache database (default %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="always run detection, never read or write the cache")
+    parser.add_argument("--manifest", default=None, help="manifest path (default: OUTPUT/manifest.json)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print failures and the summary")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    pages = find_pages(args.source)
+    if not pages:
+        print(f"No images found for {args.source}", file=sys.stderr)
+        return 1
+    params = DetectionParams(args.min_area, args.min_solidity, args.closing_kernel, args.max_aspect or None, **ENGINES[args.engine])
+    profile = EXPORT_PROFILES[args.format].with_max_height(args.max_height)
+    log = (lambda message: None) if args.quiet else (lambda message: print(message, file=sys.stderr))
+
+    store = None
+    if not args.no_cache:
+        try:
+            store = DetectionStore(args.cache)
+        except (OSError, sqlite3.Error) as e:
+            # Like open_default_store in the GUIs: without the cache every page is just detected.
+            print(f"Detection cache unavailable ({e}), continuing without it", file=sys.stderr)
+    manifest = cut_chapter(pages, args.output, params, profile, args.workers, args.start, args.stream_above, store, log)
+    manifest_path = args.manifest or os.path.join(args.output, "manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    panels = sum(len(page['panels']) for page in manifest['pages'] if not page['error'])
+    for page in manifest['pages']:
+        if page['error']: print(f"FAILED {page['path']}: {page['error']}", file=sys.stderr)
+    print(f"{len(pages)} pages, {panels} panels, {manifest['failures']} failures -> {manifest_path}", file=sys.stderr)
+    return 1 if manifest['failures'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from PIL import Image
+
+from panel_detection import detect
+from content_hash import file_digest
+from polling import drain
+
+# --- Worker (runs in a child process) ---
+def _detect_page(index, path, params):
+    """Opens one page and runs detection on it. Must stay at module level so it can be pickled."""
+    with Image.open(path) as image:
+        boxes = detect(image.convert("RGB"), params)
+    return index, boxes
+
+# --- Multi-process batch detector ---
+class BatchDetector:
+    """
+    Runs panel detection over a whole chapter on a process pool sized to the machine's cores.
+    Progress is reported through `messages` (a plain queue.Queue) so a Tk app can poll it with
+    `after()` instead of blocking the main loop. With a detection_store.DetectionStore, pages whose
+    content and parameters were seen before are answered from it and never reach the pool.
+    Message tuples:
+      ("cached", pages_from_store)
+      ("progress", pages_done, total_pages)
+      ("error", page_index, message)
+      ("done", boxes_per_page)   # same per-page box lists as the sequential loop, in page order
+    """
+    def __init__(self, max_workers=None, store=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.store = store
+        self.messages = queue.Queue()
+        self._executor = None
+        self._thread = None
+        self._cancelled = threading.Event()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, image_paths, params):
+        """Starts detection in the background with a panel_detection.DetectionParams."""
+        if self.is_running(): return
+        self._cancelled.clear()
+        self.messages = queue.Queue()
+        self._thread = threading.Thread(target=self._run, args=(list(image_paths), params), daemon=True)
+        self._thread.start()
+
+    def _run(self, image_paths, params):
+        total = len(image_paths)
+        results = [[] for _ in image_paths]
+        done = 0
+        digests, todo = {}, []
+        for idx, path in enumerate(image_paths):
+            if self._cancelled.is_set(): return
+            cached = None
+            if self.store is not None:
+                try:
+                    digests[idx] = file_digest(path)
+                    cached = self.store.lookup(digests[idx], params)
+                except OSError:
+                    pass  # Unreadable page: the worker reports the real error.
+            if cached is None:
+                todo.append(idx)
+            else:
+                results[idx] = cached
+                done += 1
+        if done:
+            self.messages.put(("cached", done))
+            self.messages.put(("progress", done, total))
+
+        # Spawned, never forked: this runs on a thread of a threaded Tk process, and a forked child
+        # can inherit locks that other threads held at that moment.
+        self._executor = ProcessPoolExecutor(max_workers=min(self.max_workers, max(len(todo), 1)), mp_context=get_context("spawn"))
+        try:
+            futures = {self._executor.submit(_detect_page, idx, image_paths[idx], params): idx for idx in todo}
+            for future in as_completed(futures):
+                if self._cancelled.is_set(): return
+                idx = futures[future]
+                try:
+                    _, boxes = future.result()
+                    results[idx] = boxes
+                    if idx in digests:
+                        self.store.store(digests[idx], params, boxes)
+                except Exception as e:
+                    self.messages.put(("error", idx, f"{os.path.basename(image_paths[idx])}: {e}"))
+                done += 1
+                self.messages.put(("progress", done, total))
+            self.messages.put(("done", results))
+        except RuntimeError:
+            # The pool was shut down by cancel() while pages were still being submitted.
+            if not self._cancelled.is_set(): raise
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def poll(self):
+        """Returns every message queued since the last call without blocking."""
+        return drain(self.messages)
+
+    def cancel(self):
+        self._cancelled.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from PIL import Image
+
+from panel_detection import DetectionParams, detect
+from batch_cut import ENGINES, find_pages
+
+# --- Detection benchmark ---
+# Times every engine on synthetic pages with known panels (and optionally on real pages), and
+# scores the boxes against the ground truth, so detector changes can be compared commit to commit:
+#   python benchmark_detection.py -o bench/before.json
+#   python benchmark_detection.py -o bench/after.json --compare bench/before.json
+#   python benchmark_detection.py --pages chapter_012/ --truth out/chapter_012/manifest.json
+# Real-page ground truth is a batch_cut.py manifest whose boxes were reviewed by hand.
+
+RESOLUTIONS = {"page": [(800, 1200), (1600, 2400), (2400, 3600)], "strip": [(800, 8000), (1200, 24000)]}
+VARIANTS = {"clean": {'specks': 0, 'gaps': 0},
+            "noisy": {'specks': 400, 'gaps': 0},
+            "broken": {'specks': 0, 'gaps': 3},
+            "noisy+broken": {'specks': 400, 'gaps': 3}}
+
+# --- Synthetic pages ---
+def _layout(rng, width, height, kind):
+    """Panel rectangles (x1, y1, x2, y2) for a page: rows of 1-3 panels, or one column for a strip."""
+    scale = width / 800.0
+    gutter = lambda lo, hi: int(rng.integers(lo, hi) * scale)
+    boxes, y = [], gutter(20, 50)
+    while True:
+        row_h = gutter(250, 600) if kind == "page" else gutter(500, 1400)
+        if y + row_h > height - gutter(20, 40): break
+        count = 1 if kind == "strip" else int(rng.integers(1, 4))
+        x, margin = gutter(20, 50), gutter(20, 50)
+        inner = width - x - margin - (count - 1) * gutter(20, 30)
+        for i in range(count):
+            w = inner // count
+            boxes.append((x, y, x + w, y + row_h))
+            x += w + gutter(20, 30)
+        y += row_h + (gutter(25, 70) if kind == "page" else gutter(80, 400))
+    return boxes
+
+def make_page(seed, width, height, kind="page", specks=0, gaps=0):
+    """
+    Draws a grayscale manhwa-like page and returns (RGB PIL image, ground-truth boxes).
+    Panels get a 2-4 px black border and some mid-gray artwork inside. `specks` dark dots land
+    anywhere (scan dust), and each panel border gets `gaps` one or two pixel breaks, which only
+    the closing step can repair.
+    """
+    rng = np.random.default_rng(seed)
+    page = rng.integers(246, 256, (height, width), dtype=np.uint8)  # Off-white paper grain
+    scale = width / 800.0
+    truth = _layout(rng, width, height, kind)
+    for x1, y1, x2, y2 in truth:
+        t = int(rng.integers(2, 5))
+        panel = np.full((y2 - y1, x2 - x1), 255, np.uint8)
+        for _ in range(int(rng.integers(3, 9))):
+            center = (int(rng.integers(0, x2 - x1)), int(rng.integers(0, y2 - y1)))
+            axes = (int(rng.integers(10, 80) * scale), int(rng.integers(10, 80) * scale))
+            cv2.ellipse(panel, center, axes, float(rng.integers(0, 180)), 0, 360, int(rng.integers(40, 200)), -1)
+        # Artwork stays clear of the border, like the white margin inside real panels.
+        m = 2 * t + 4
+        page[y1 + m:y2 - m, x1 + m:x2 - m] = np.minimum(page[y1 + m:y2 - m, x1 + m:x2 - m], panel[m:-m, m:-m])
+        page[y1 + t:y1 + m, x1:x2] = page[y2 - m:y2 - t, x1:x2] = 255
+        page[y1:y2, x1 + t:x1 + m] = page[y1:y2, x2 - m:x2 - t] = 255
+        page[y1:y1 + t, x1:x2] = page[y2 - t:y2, x1:x2] = 0
+        page[y1:y2, x1:x1 + t] = page[y1:y2, x2 - t:x2] = 0
+        for _ in range(gaps):
+            g = int(rng.integers(1, 3))
+            if rng.integers(0, 2):
+                gx = int(rng.integers(x1 + 10, x2 - 10))
+                rows = slice(y1, y1 + t) if rng.integers(0, 2) else slice(y2 - t, y2)
+                page[rows, gx:gx + g] = 255
+            else:
+                gy = int(rng.integers(y1 + 10, y2 - 10))
+                cols = slice(x1, x1 + t) if rng.integers(0, 2) else slice(x2 - t, x2)
+                page[gy:gy + g, cols] = 255
+    for _ in range(specks):
+        cx, cy = int(rng.integers(0, width)), int(rng.integers(0, height))
+        cv2.circle(page, (cx, cy), int(rng.integers(1, 3)), int(rng.integers(0, 120)), -1)
+    return Image.fromarray(page).convert("RGB"), truth
+
+def synthetic_corpus(quick=False, seed=0):
+    """Yields (name, image, truth) for every layout, resolution and variant."""
+    for kind, sizes in RESOLUTIONS.items():
+        for width, height in sizes[:1] if quick else sizes:
+            for variant, options in VARIANTS.items():
+                image, truth = make_page(seed, width, height, kind, **options)
+                yield f"{kind}-{width}x{height}-{variant}", image, truth
+                seed += 1
+
+def real_corpus(source, truth_path=None):
+    """Yields (name, image, truth or None) for real pages, with truth from a reviewed manifest."""
+    truth = {}
+    if truth_path:
+        with open(truth_path, encoding="utf-8") as f:
+            for page in json.load(f)['pages']:
+                truth[os.path.abspath(page['path'])] = [tuple(b) for b in page['boxes']]
+    for path in find_pages(source):
+        with Image.open(path) as image:
+            yield os.path.basename(path), image.convert("RGB"), truth.get(os.path.abspath(path))
+
+# --- Measuring ---
+def _iou(a, b):
+    iw = min(a[2], b[2]) - max(a[0], b[0])
+    ih = min(a[3], b[3]) - max(a[1], b[1])
+    if iw <= 0 or ih <= 0: return 0.0
+    inter = iw * ih
+    return inter / float((a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter)
+
+def score(boxes, truth, min_iou=0.5):
+    """Greedy one-to-one matching by IoU. Returns (true positives, false positives, false negatives)."""
+    pairs = sorted(((_iou(b, t), i, j) for i, b in enumerate(boxes) for j, t in enumerate(truth)), reverse=True)
+    used_b, used_t = set(), set()
+    for iou, i, j in pairs:
+        if iou < min_iou: break
+        if i in used_b or j in used_t: continue
+        used_b.add(i)
+        used_t.add(j)
+    return len(used_b), len(boxes) - len(used_b), len(truth) - len(used_t)
+
+def measure(image, params, repeat=3):
+    """
+    Median milliseconds of detect(), tracemalloc peak in MB, and detect()'s boxes. The contour
+    engines also report a median per-stage breakdown through detect()'s `timings` hook.
+    """
+    totals, stages = [], {}
+    boxes = detect(image, params)  # Untimed warm-up: the first call pays for OpenCV's lazy setup.
+    for _ in range(repeat):
+        timings = {}
+        t = time.perf_counter()
+        boxes = detect(image, params, timings)
+        totals.append(time.perf_counter() - t)
+        for name, seconds in timings.items():
+            stages.setdefault(name, []).append(seconds)
+    # Memory is measured in a separate run: tracing every allocation distorts the timings.
+    tracemalloc.start()
+    detect(image, params)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'total_ms': round(statistics.median(totals) * 1000, 3),
+            'stages_ms': {name: round(statistics.median(s) * 1000, 3) for name, s in stages.items()},
+            'peak_mb': round(peak / 2 ** 20, 2)}, boxes
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(corpus, engines, base_params, repeat=3, min_iou=0.5, log=print):
+    """Benchmarks every page of `corpus` with every engine. Returns the results document."""
+    results = []
+    for name, image, truth in corpus:
+        for engine in engines:
+            params = base_params.replace(**ENGINES[engine])
+            entry, boxes = measure(image, params, repeat)
+            entry.update({'page': name, 'engine': engine, 'width': image.width, 'height': image.height, 'panels': len(boxes)})
+            if truth is not None:
+                tp, fp, fn = score(boxes, truth, min_iou)
+                entry.update({'tp': tp, 'fp': fp, 'fn': fn,
+                              'precision': round(tp / (tp + fp), 4) if tp + fp else 1.0,
+                              'recall': round(tp / (tp + fn), 4) if tp + fn else 1.0})
+            results.append(entry)
+            quality = f"  P={entry['precision']:.3f} R={entry['recall']:.3f}" if truth is not None else ""
+            log(f"{name:<32} {engine:<9} {entry['total_ms']:>9.1f} ms {entry['peak_mb']:>8.1f} MB{quality}")
+    return {'commit': _git_commit(), 'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(), 'opencv': cv2.__version__, 'numpy': np.__version__,
+            'params': base_params.to_dict(), 'min_iou': min_iou, 'results': results, 'summary': summarize(results)}
+
+def summarize(results):
+    """Per engine: summed time, worst peak memory and micro-averaged precision/recall."""
+    summary = {}
+    for engine in dict.fromkeys(r['engine'] for r in results):
+        rows = [r for r in results if r['engine'] == engine]
+        scored = [r for r in rows if 'tp' in r]
+        tp, fp, fn = (sum(r[k] for r in scored) for k in ("tp", "fp", "fn"))
+        summary[engine] = {'pages': len(rows), 'total_ms': round(sum(r['total_ms'] for r in rows), 3),
+                           'peak_mb': max(r['peak_mb'] for r in rows),
+                           'precision': round(tp / (tp + fp), 4) if tp + fp else None,
+                           'recall': round(tp / (tp + fn), 4) if tp + fn else None}
+    return summary
+
+def compare(current, baseline, log=print):
+    """Prints how each engine's summary moved against an earlier results file."""
+    log(f"\nvs {baseline.get('commit') or 'baseline'} ({baseline.get('time')})")
+    for engine, now in current['summary'].items():
+        before = baseline.get('summary', {}).get(engine)
+        if not before:
+            log(f"{engine:<9} (not in baseline)")
+            continue
+        change = (now['total_ms'] / before['total_ms'] - 1) * 100 if before['total_ms'] else 0.0
+        line = f"{engine:<9} time {before['total_ms']:.1f} -> {now['total_ms']:.1f} ms ({change:+.1f}%)  peak {before['peak_mb']} -> {now['peak_mb']} MB"
+        for key in ("precision", "recall"):
+            if now[key] is not None and before[key] is not None:
+                line += f"  {key[0].upper()} {before[key]:.3f} -> {now[key]:.3f}"
+        log(line)
+
+def parse_args(argv=None):
+    defaults = DetectionParams()
+    parser = argparse.ArgumentParser(description="Benchmark panel detection speed, memory and accuracy.")
+    parser.add_argument("-o", "--output", default="detection_benchmark.json", help="results file (default %(default)s)")
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES), help="engines to run (default: all)")
+    parser.add_argument("--pages", default=None, help="also benchmark real pages from this directory or glob")
+    parser.add_argument("--truth", default=None, help="reviewed batch_cut.py manifest giving the real pages' true boxes")
+    parser.add_argument("--no-synthetic", action="store_true", help="only benchmark the real pages")
+    parser.add_argument("--quick", action="store_true", help="one resolution per layout instead of all")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per page and engine, the median is kept (default %(default)s)")
+    parser.add_argument("--min-iou", type=float, default=0.5, help="overlap for a box to count as found (default %(default)s)")
+    parser.add_argument("--min-area", type=float, default=defaults.min_area_perc)
+    parser.add_argument("--min-solidity", type=float, default=defaults.min_solidity)
+    parser.add_argument("--closing-kernel", type=int, default=defaults.closing_kernel_size)
+    parser.add_argument("--max-aspect", type=float, default=defaults.max_aspect_ratio, help="0 = off")
+    parser.add_argument("--seed", type=int, default=0, help="synthetic corpus seed (default %(default)s)")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    params = DetectionParams(args.min_area, args.min_solidity, args.closing_kernel, args.max_aspect or None)
+    corpora = []
+    if not args.no_synthetic:
+        corpora.append(synthetic_corpus(args.quick, args.seed))
+    if args.pages:
+        corpora.append(real_corpus(args.pages, args.truth))
+    if not corpora:
+        print("Nothing to benchmark: pass --pages or drop --no-synthetic", file=sys.stderr)
+        return 1
+    document = run((page for corpus in corpora for page in corpus), args.engines, params, args.repeat, args.min_iou)
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(document, json.load(f))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+from collections import OrderedDict
+from PIL import Image, ImageTk
+
+# --- Zoom pyramid ---
+def build_pyramid(pil_image, min_size=64):
+    """Returns [full, 1/2, 1/4, ...] copies of the image, each level half the size of the one before."""
+    if pil_image.mode not in ("RGB", "RGBA", "L", "LA"):
+        pil_image = pil_image.convert("RGBA")
+    levels = [pil_image]
+    while min(levels[-1].size) >= 2 * min_size:
+        levels.append(levels[-1].reduce(2))
+    return levels
+
+# --- Viewport-only tiled rendering ---
+class TiledRenderer:
+    """
+    Draws a zoomed PIL image onto a Tk canvas without resizing the whole page.
+    Only the tiles covering the visible canvas area (plus a margin) are resampled, and every
+    resampled tile is cached per zoom level, so panning just moves the existing canvas items
+    and creates the few tiles that scrolled into view.
+    Tiles are resampled from the smallest pyramid level that is still larger than the zoom, and
+    while the wheel is moving (see `zooming`) a fast filter is used until zooming pauses.
+    """
+    def __init__(self, canvas, tile_size=512, margin=256, max_tiles=96, tag="image", settle_ms=200):
+        self.canvas = canvas
+        self.tile_size = tile_size
+        self.margin = margin
+        self.max_tiles = max_tiles
+        self.tag = tag
+        self.settle_ms = settle_ms
+        self.image = None
+        self.levels = []
+        self._tiles = OrderedDict()  # (zoom_key, tx, ty) -> (PhotoImage, is_high_quality), LRU first
+        self._items = {}             # (zoom_key, tx, ty) -> canvas item id currently on the canvas
+        self._zoom_key = None
+        self._offset = (0, 0)
+        self._fast = False
+        self._refine_job = None
+        self._last_view = None
+
+    def set_image(self, pil_image):
+        """Switches to a new page: builds its zoom pyramid and drops every cached tile of the previous one."""
+        self.image = pil_image
+        self.levels = build_pyramid(pil_image) if pil_image is not None else []
+        self._tiles.clear()
+        self.clear()
+
+    def clear(self):
+        """Removes the tile items from the canvas (the tile cache is kept)."""
+        self.canvas.delete(self.tag)
+        self._items.clear()
+        self._zoom_key = None
+
+    def zooming(self):
+        """Call on every zoom step: tiles use a fast filter until zooming pauses, then get a LANCZOS pass."""
+        self._fast = True
+        if self._refine_job is not None:
+            self.canvas.after_cancel(self._refine_job)
+        self._refine_job = self.canvas.after(self.settle_ms, self._refine)
+
+    def _refine(self):
+        self._refine_job = None
+        self._fast = False
+        if self._last_view and self._last_view[0] is self.image:
+            self.render(*self._last_view)
+
+    def render(self, pil_image, zoom, image_x, image_y):
+        """Shows `pil_image` scaled by `zoom` with its top-left corner at canvas (image_x, image_y)."""
+        if pil_image is not self.image:
+            self.set_image(pil_image)
+        if pil_image is None: return
+        self._last_view = (pil_image, zoom, image_x, image_y)
+        # The apps sometimes wipe the canvas with delete("all"); start over if our items are gone.
+        if self._items and not self.canvas.find_withtag(self.tag):
+            self._items.clear()
+            self._zoom_key = None
+
+        zoom_key = round(zoom, 6)
+        if zoom_key != self._zoom_key:
+            self.canvas.delete(self.tag)
+            self._items.clear()
+            self._zoom_key = zoom_key
+        elif self._items:
+            # Same zoom level: one canvas call moves every visible tile.
+            dx, dy = image_x - self._offset[0], image_y - self._offset[1]
+            if dx or dy:
+                self.canvas.move(self.tag, dx, dy)
+        self._offset = (image_x, image_y)
+
+        iw, ih = pil_image.size
+        nw, nh = int(iw * zoom), int(ih * zoom)
+        if nw < 1 or nh < 1: return
+        cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
+        t = self.tile_size
+        left = max(0, int(-image_x) - self.margin)
+        top = max(0, int(-image_y) - self.margin)
+        right = min(nw, int(-image_x + cw) + self.margin)
+        bottom = min(nh, int(-image_y + ch) + self.margin)
+
+        visible = set()
+        if right > left and bottom > top:
+            for ty in range(top // t, (bottom - 1) // t + 1):
+                for tx in range(left // t, (right - 1) // t + 1):
+                    visible.add((zoom_key, tx, ty))
+
+        for key in [k for k in self._items if k not in visible]:
+            self.canvas.delete(self._items.pop(key))
+        for key in visible:
+            _, tx, ty = key
+            if key in self._items:
+                # Swap in the high-quality tile once zooming has settled.
+                if not self._fast and not self._tiles.get(key, (None, False))[1]:
+                    self.canvas.itemconfig(self._items[key], image=self._get_tile(key, zoom, nw, nh))
+                continue
+            tile = self._get_tile(key, zoom, nw, nh)
+            self._items[key] = self.canvas.create_image(image_x + tx * t, image_y + ty * t, anchor="nw", image=tile, tags=self.tag)
+        self.canvas.tag_lower(self.tag)
+
+    def _source_level(self, zoom):
+        """Picks the smallest pyramid level that is still at least as large as the requested zoom."""
+        index = 0
+        while index + 1 < len(self.levels) and zoom <= 1.0 / (2 ** (index + 1)):
+            index += 1
+        return self.levels[index]
+
+    def _get_tile(self, key, zoom, nw, nh):
+        cached = self._tiles.get(key)
+        if cached is not None and (cached[1] or self._fast):
+            self._tiles.move_to_end(key)
+            return cached[0]
+        _, tx, ty = key
+        t = self.tile_size
+        x0, y0 = tx * t, ty * t
+        x1, y1 = min(x0 + t, nw), min(y0 + t, nh)
+        source = self._source_level(zoom)
+        sw, sh = source.size
+        scale = sw / self.image.size[0]  # level pixels per full-resolution pixel
+        box = (x0 / zoom * scale, y0 / zoom * scale, min(sw, x1 / zoom * scale), min(sh, y1 / zoom * scale))
+        resample = Image.Resampling.BILINEAR if self._fast else Image.Resampling.LANCZOS
+        resized = source.resize((x1 - x0, y1 - y0), resample, box=box)
+        tile = ImageTk.PhotoImage(resized)
+        self._tiles[key] = (tile, not self._fast)
+        self._tiles.move_to_end(key)
+        if len(self._tiles) > self.max_tiles:
+            # Evict least recently used tiles, but never one that is still shown on the canvas.
+            for old_key in [k for k in self._tiles if k not in self._items and k != key]:
+                if len(self._tiles) <= self.max_tiles: break
+                del self._tiles[old_key]
+        return tile
+
+# --- Once-per-frame canvas item updates ---
+class CanvasBatch:
+    """
+    Queues coords, style and tag-move changes to canvas items and sends them to Tk in one pass
+    from `after_idle`, so a burst of motion events or a redraw of hundreds of boxes costs one
+    flush per frame instead of a Tcl round-trip per item per event.
+    Later coords for the same item replace earlier ones, moves of the same tag add up, and a style
+    that is already on the item is never sent again.
+    """
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self._coords = {}   # item -> canvas coords to set
+        self._styles = {}   # item -> (outline, width) to set
+        self._shown = {}    # item -> (outline, width) currently on the canvas
+        self._moves = {}    # tag -> [dx, dy]
+        self._job = None
+
+    def _schedule(self):
+        if self._job is None:
+            self._job = self.canvas.after_idle(self._idle_flush)
+
+    def _idle_flush(self):
+        self._job = None
+        self.flush()
+
+    def coords(self, item, coords):
+        self._coords[item] = coords
+        self._schedule()
+
+    def move(self, tag, dx, dy):
+        """Moves every item with `tag` in a single canvas call."""
+        if not dx and not dy: return
+        if self._coords:
+            self.flush()  # Absolute coords queued earlier must land before the relative move.
+        move = self._moves.setdefault(tag, [0.0, 0.0])
+        move[0] += dx
+        move[1] += dy
+        self._schedule()
+
+    def style(self, item, outline, width):
+        if self._shown.get(item) == (outline, width):
+            self._styles.pop(item, None)
+            return
+        self._styles[item] = (outline, width)
+        self._schedule()
+
+    def created(self, item, outline, width):
+        """Records the style an item was created with, so the first style() call can be skipped."""
+        self._shown[item] = (outline, width)
+
+    def forget(self, item):
+        """Drops everything queued or remembered for a deleted item."""
+        self._coords.pop(item, None)
+        self._styles.pop(item, None)
+        self._shown.pop(item, None)
+
+    def reset(self):
+        """Forgets every item, e.g. after the canvas items were deleted with a tag."""
+        self._coords.clear()
+        self._styles.clear()
+        self._shown.clear()
+        self._moves.clear()
+
+    def flush(self):
+        """Applies everything queued now; also runs by itself at the next idle."""
+        if self._job is not None:
+            self.canvas.after_cancel(self._job)
+            self._job = None
+        for tag, (dx, dy) in self._moves.items():
+            self.canvas.move(tag, dx, dy)
+        for item, coords in self._coords.items():
+            self.canvas.coords(item, *coords)
+        for item, (outline, width) in self._styles.items():
+            self.canvas.itemconfig(item, outline=outline, width=width)
+            self._shown[item] = (outline, width)
+        self._moves.clear()
+        self._coords.clear()
+        self._styles.clear()
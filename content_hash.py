@@ -0,0 +1,10 @@
+import hashlib
+
+# --- Content hashing shared by the on-disk caches ---
+def file_digest(path, chunk_size=1 << 20):
+    """Content hash of a file. Renamed or copied files still hit a cache keyed by it, edited ones do not."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,170 @@
+import copy
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from PIL import Image
+
+from polling import drain
+
+# --- Output codecs ---
+class ExportProfile:
+    """
+    How saved panels are encoded: the codec, its compression/quality knobs, and an optional
+    downscale so no panel is taller than the edit sequence (e.g. 1080 for a 1920x1080 timeline).
+    """
+    EXTENSIONS = {"PNG": "png", "WEBP": "webp", "JPEG": "jpg", "TIFF": "tif"}
+
+    def __init__(self, format="PNG", compress_level=6, quality=95, webp_method=4, max_height=None):
+        self.format = format.upper()
+        if self.format not in self.EXTENSIONS:
+            raise ValueError(f"Unsupported export format: {format}")
+        self.compress_level = compress_level  # PNG zlib level, 0 (fastest) to 9 (smallest)
+        self.quality = quality                # JPEG quality
+        self.webp_method = webp_method        # WebP effort, 0 (fastest) to 6 (smallest)
+        self.max_height = max_height
+
+    @property
+    def extension(self):
+        return self.EXTENSIONS[self.format]
+
+    def with_max_height(self, max_height):
+        """Copy of this profile that downscales panels taller than `max_height` (None or 0 = never)."""
+        profile = copy.copy(self)
+        profile.max_height = max_height or None
+        return profile
+
+    def filename(self, counter):
+        return f"panel_{counter:03d}.{self.extension}"
+
+    def prepare(self, image):
+        """Applies the optional downscale and converts to a mode the codec can store."""
+        if self.max_height and image.height > self.max_height:
+            width = max(1, round(image.width * self.max_height / image.height))
+            image = image.resize((width, self.max_height), Image.Resampling.LANCZOS)
+        if self.format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode == "P":
+            image = image.convert("RGBA")
+        return image
+
+    def save(self, image, save_path):
+        image = self.prepare(image)
+        if self.format == "PNG":
+            image.save(save_path, "PNG", compress_level=self.compress_level)
+        elif self.format == "WEBP":
+            image.save(save_path, "WEBP", lossless=True, quality=100, method=self.webp_method)
+        elif self.format == "JPEG":
+            image.save(save_path, "JPEG", quality=self.quality, subsampling=0)
+        else:
+            image.save(save_path, "TIFF", compression=None)
+
+# Presets offered in the settings window, the first one matches the old always-PNG behaviour.
+EXPORT_PROFILES = {
+    "PNG": ExportProfile("PNG"),
+    "PNG (fast, larger)": ExportProfile("PNG", compress_level=1),
+    "PNG (smallest, slow)": ExportProfile("PNG", compress_level=9),
+    "WebP (lossless)": ExportProfile("WEBP", webp_method=2),
+    "JPEG (high quality)": ExportProfile("JPEG", quality=95),
+    "TIFF (uncompressed)": ExportProfile("TIFF"),
+}
+DEFAULT_EXPORT_PROFILE = "PNG"
+
+# --- Background crop export ---
+class ExportQueue:
+    """
+    Crops and encodes panels on a worker pool so the UI can move on to the next page right away.
+    Callers pick the output path (and so the panel_NNN number) at submit time, which keeps the
+    numbering in submission order no matter which worker finishes first. Pillow releases the GIL
+    while encoding, so plain threads are enough and the page never has to be pickled.
+    A Tk app calls `attach(root, report)` once and `watch()` after submitting; the queue then polls
+    itself with after() and calls `report(written, errors, pending)` with the totals since it was
+    last idle, a final time with pending == 0 once everything is on disk.
+    """
+    def __init__(self, workers=None):
+        self.messages = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1), thread_name_prefix="crop-export")
+        self._futures = set()
+        self._lock = threading.Lock()
+        self._root, self._report = None, None
+        self._watching = False
+        self._written, self._errors = 0, []
+
+    def submit(self, image, box, save_path, profile=None):
+        """Queues `image.crop(box)` to be written to `save_path` with `profile` (plain PNG by default)."""
+        future = self._executor.submit(self._save, image, box, save_path, profile or EXPORT_PROFILES[DEFAULT_EXPORT_PROFILE])
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def _save(self, image, box, save_path, profile):
+        try:
+            profile.save(image.crop(box), save_path)
+            self.messages.put(("saved", save_path))
+        except Exception as e:
+            self.messages.put(("error", save_path, str(e)))
+
+    def pending(self):
+        with self._lock:
+            return len(self._futures)
+
+    def poll(self):
+        """Returns (saved_paths, errors) for every job finished since the last call, without blocking."""
+        saved, errors = [], []
+        for message in drain(self.messages):
+            if message[0] == "saved": saved.append(message[1])
+            else: errors.append(f"{os.path.basename(message[1])}: {message[2]}")
+        return saved, errors
+
+    # --- Tk integration ---
+    def attach(self, root, report, interval_ms=100):
+        """Reports progress to a Tk app: `report(written, errors, pending)` runs on the main loop."""
+        self._root, self._report, self._interval = root, report, interval_ms
+
+    def watch(self):
+        """Starts polling from the main loop after a submit, unless it is already running."""
+        if self._root is None or self._watching: return
+        self._watching = True
+        self._root.after(self._interval, self._tick)
+
+    def _tick(self):
+        saved, errors = self.poll()
+        self._written += len(saved)
+        self._errors += errors
+        pending = self.pending()
+        if pending or not self.messages.empty():
+            self._report(self._written, self._errors, pending)
+            self._root.after(self._interval, self._tick)
+            return
+        self._watching = False
+        written, errors = self._written, self._errors
+        self._written, self._errors = 0, []
+        self._report(written, errors, 0)
+
+    @staticmethod
+    def status_text(written, errors, pending):
+        """The status line most apps show for report()."""
+        if pending: return f"Saving... {written} written, {pending} pending"
+        if errors: return f"Saved {written} panels, {len(errors)} failed: {errors[0]}"
+        return f"Saved {written} panels!"
+
+    def flush(self):
+        """Blocks until every queued panel has been written."""
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures)
+
+    def close(self):
+        """Flushes outstanding work and stops the workers. Call before the app exits."""
+        if self._root is not None and self.pending():
+            # The main loop is about to stop: show the last state now, the window is still up.
+            saved, errors = self.poll()
+            self._report(self._written + len(saved), self._errors + errors, self.pending())
+            self._root.update_idletasks()
+        self.flush()
+        self._executor.shutdown(wait=True)
@@ -1,10 +1,24 @@
 import customtkinter as ctk
-from tkinter import filedialog, Canvas, TclError
-from PIL import Image, ImageTk
+from tkinter import filedialog, messagebox, Canvas
 import os
-import cv2
-import numpy as np
-import copy
+from panel_detection import DetectionParams, DetectionCache
+from batch_detection import BatchDetector
+from detection_store import open_default_store
+from canvas_renderer import TiledRenderer, CanvasBatch
+from page_cache import PageCache
+from crop_export import ExportQueue, EXPORT_PROFILES, DEFAULT_EXPORT_PROFILE
+from strip_reader import StripCutter
+from session_journal import SessionJournal
+from edit_history import EditHistory
+from selection_index import SelectionIndex
+from selection_store import SelectionStore
+
+# Detection engines offered in the settings window, as DetectionParams fields.
+DETECTION_ENGINES = {
+    "Contours": {'engine': "contours", 'coarse_scale': 1.0},
+    "Contours (coarse-to-fine, large pages)": {'engine': "contours", 'coarse_scale': 0.25},
+    "Gutter projection (vertical strips)": {'engine': "gutters"},
+}
 
 # --- Settings Window Class (Updated for Real-Time Preview) ---
 class DetectionSettingsWindow(ctk.CTkToplevel):
@@ -12,7 +26,7 @@ class DetectionSettingsWindow(ctk.CTkToplevel):
         super().__init__(master)
         self.transient(master)
         self.title("Detection Settings")
-        self.geometry("400x280")
+        self.geometry("400x440")
         self.app = master
         self.grid_columnconfigure(1, weight=1)
 
@@ -43,6 +57,27 @@ class DetectionSettingsWindow(ctk.CTkToplevel):
         self.closing_slider.set(self.app.closing_kernel_size)
         self.closing_slider.grid(row=5, column=0, columnspan=3, padx=10, pady=(0,10), sticky="ew")
 
+        # --- NEW: Detection Engine Selection ---
+        self.engine_label = ctk.CTkLabel(self, text="Detection Engine:")
+        self.engine_label.grid(row=6, column=0, padx=10, pady=(10,0), sticky="w")
+        self.engine_menu = ctk.CTkOptionMenu(self, values=list(DETECTION_ENGINES), command=self.update_engine)
+        self.engine_menu.set(self.app.detection_engine)
+        self.engine_menu.grid(row=6, column=1, columnspan=2, padx=10, pady=(10,0), sticky="ew")
+
+        # --- NEW: Export Profile Settings ---
+        self.format_label = ctk.CTkLabel(self, text="Export Format:")
+        self.format_label.grid(row=7, column=0, padx=10, pady=(10,0), sticky="w")
+        self.format_menu = ctk.CTkOptionMenu(self, values=list(EXPORT_PROFILES), command=self.update_format)
+        self.format_menu.set(self.app.export_format)
+        self.format_menu.grid(row=7, column=1, columnspan=2, padx=10, pady=(10,0), sticky="ew")
+        self.height_label = ctk.CTkLabel(self, text="Fit to Height (px, 0 = off):")
+        self.height_label.grid(row=8, column=0, padx=10, pady=(10,10), sticky="w")
+        self.height_entry = ctk.CTkEntry(self, width=80)
+        self.height_entry.insert(0, str(self.app.export_max_height or 0))
+        self.height_entry.grid(row=8, column=1, columnspan=2, padx=10, pady=(10,10), sticky="w")
+        self.height_entry.bind("<FocusOut>", self.update_max_height)
+        self.height_entry.bind("<Return>", self.update_max_height)
+
     def update_area(self, value):
         self.app.min_area_perc = value
         self.area_value_label.configure(text=f"{value:.1f}")
@@ -62,6 +97,20 @@ class DetectionSettingsWindow(ctk.CTkToplevel):
         self.closing_value_label.configure(text=f"{kernel_size}")
         self.app.request_detection_update()
 
+    def update_engine(self, value):
+        self.app.detection_engine = value
+        self.app.request_detection_update()
+
+    def update_format(self, value):
+        self.app.export_format = value
+
+    def update_max_height(self, event=None):
+        try:
+            self.app.export_max_height = max(0, int(self.height_entry.get()))
+        except ValueError:
+            self.height_entry.delete(0, "end")
+            self.height_entry.insert(0, str(self.app.export_max_height or 0))
+
 # --- Main Application Class (Updated) ---
 class ManhwaCropper(ctk.CTk):
     def __init__(self):
@@ -73,8 +122,10 @@ class ManhwaCropper(ctk.CTk):
         # --- Detection settings state ---
         self.min_area_perc, self.min_solidity, self.max_aspect_ratio = 0.1, 0.85, 25
         self.closing_kernel_size = 3 # NEW: Default kernel size for closing operation
+        self.detection_engine = "Contours" # NEW: Key into DETECTION_ENGINES
         self.settings_window = None
         self.debounce_timer = None # NEW: For real-time preview
+        self.detection_cache = DetectionCache() # NEW: Slider moves only redo the stages they affect
 
         # --- Other state variables ---
         self.image_paths, self.current_image_index, self.crop_counter = [], 0, 1
@@ -82,12 +133,23 @@ class ManhwaCropper(ctk.CTk):
         self.original_pil_image, self.display_image_tk = None, None
         self.zoom_level, self.image_x, self.image_y = 1.0, 0, 0
         self.pan_start_x, self.pan_start_y = 0, 0
-        self.undo_stack, self.redo_stack = [], []
-        self.selections, self.active_selections = [], []
-        self.drag_mode, self.drag_start_pos, self.drag_original_coords = None, None, {}
+        self.page_cache = PageCache(mode="RGB") # NEW: Prefetches neighbouring pages while reviewing
+        self.history = EditHistory() # NEW: Undo stores only the boxes each edit changed
+        self.selections = SelectionStore() # NEW: Boxes, canvas ids and active flags as NumPy columns
+        self.selection_index = SelectionIndex() # NEW: Image-space grid for hover/click hit-tests
+        self.drag_mode, self.drag_start_pos, self.drag_original_coords, self.drag_applied = None, None, None, (0, 0)
         self.handle_size, self.new_rect_id = 8, None
         self.detected_panels_per_image, self.batch_review_index = [], 0
         self.in_batch_review_mode = False
+        self.journal = None # NEW: Crash-safe record of the batch review, see SessionJournal
+        self.pending_approvals = [] # (journal, page index, crop_counter, export futures) not journaled yet
+        self.batch_detector = BatchDetector(store=open_default_store()) # NEW: Multi-process batch detection, cached on disk
+        self.batch_errors, self.batch_cached = [], 0
+        self.export_queue = ExportQueue() # NEW: Crops are written in the background
+        self.export_queue.attach(self, self.report_exports)
+        self.export_format, self.export_max_height = DEFAULT_EXPORT_PROFILE, 0 # NEW: Codec and sequence-height downscale
+        self.strip_cutter = StripCutter() # NEW: Band-by-band cutting of strips too tall to load
+        self.cutting_strip = False # True until the cut's panel numbers have been added to crop_counter
 
         # --- UI Layout ---
         self.grid_columnconfigure(1, weight=1)
@@ -96,12 +158,16 @@ class ManhwaCropper(ctk.CTk):
         self.toolbar_frame.grid(row=0, column=0, rowspan=2, padx=10, pady=10, sticky="ns")
         self.canvas = Canvas(self, bg="gray20", highlightthickness=0)
         self.canvas.grid(row=0, column=1, padx=(0, 10), pady=10, sticky="nsew")
+        self.renderer = TiledRenderer(self.canvas) # NEW: Viewport-only tiled rendering
+        self.canvas_batch = CanvasBatch(self.canvas) # NEW: Box updates go to Tk once per frame
+        self.box_view = None # (zoom, x, y) the box items are currently drawn at
         self.status_frame = ctk.CTkFrame(self, height=30)
         self.status_frame.grid(row=1, column=1, padx=(0, 10), pady=(0, 10), sticky="ew")
         self.status_label = ctk.CTkLabel(self.status_frame, text="Load a chapter to begin...", anchor="w")
         self.status_label.pack(side="left", padx=10)
         self.populate_toolbar()
         self.setup_bindings()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def populate_toolbar(self):
         # File Operations
@@ -111,6 +177,8 @@ class ManhwaCropper(ctk.CTk):
         self.load_button.pack(fill="x", padx=10, pady=5)
         self.save_page_button = ctk.CTkButton(self.toolbar_frame, text="Save Page (Ctrl+E)", command=self.save_current_page_crops, state="disabled")
         self.save_page_button.pack(fill="x", padx=10, pady=5)
+        self.cut_strip_button = ctk.CTkButton(self.toolbar_frame, text="Cut Tall Strip...", command=self.cut_tall_strip)
+        self.cut_strip_button.pack(fill="x", padx=10, pady=5)
         # Detection
         detect_label = ctk.CTkLabel(self.toolbar_frame, text="Detection", font=ctk.CTkFont(weight="bold"))
         detect_label.pack(pady=(15, 2), padx=10, anchor="w")
@@ -162,36 +230,14 @@ class ManhwaCropper(ctk.CTk):
         self.canvas.bind("<ButtonPress-2>", self.on_pan_start); self.canvas.bind("<B2-Motion>", self.on_pan_drag)
         self.canvas.bind("<Configure>", self.on_canvas_resize)
 
+    def detection_params(self):
+        """Current slider values and engine as a DetectionParams."""
+        return DetectionParams(self.min_area_perc, self.min_solidity, self.closing_kernel_size, self.max_aspect_ratio,
+                               **DETECTION_ENGINES[self.detection_engine])
+
     def _run_detection_logic(self, pil_image):
         """Encapsulates the OpenCV detection logic, returns image-space boxes."""
-        open_cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-        gray = cv2.cvtColor(open_cv_image, cv2.COLOR_BGR2GRAY)
-        _, thresh = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY_INV)
-
-        # --- NEW: Morphological Closing Operation ---
-        # This helps close small gaps in the borders of panels.
-        kernel = np.ones((self.closing_kernel_size, self.closing_kernel_size), np.uint8)
-        closing = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-
-        contours, _ = cv2.findContours(closing, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        img_w, img_h = pil_image.size
-        min_area = (self.min_area_perc / 100.0) * (img_w * img_h)
-        boxes = []
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            if area < min_area: continue
-            x, y, w, h = cv2.boundingRect(cnt)
-            if h == 0 or w == 0: continue
-            hull = cv2.convexHull(cnt)
-            solidity = area / cv2.contourArea(hull) if cv2.contourArea(hull) > 0 else 0
-            ar = w / float(h)
-            if solidity < self.min_solidity: continue
-            if ar > self.max_aspect_ratio or ar < (1 / self.max_aspect_ratio): continue
-            boxes.append((x, y, x + w, y + h))
-        
-        boxes.sort(key=lambda b: (b[1], b[0]))
-        return boxes
+        return self.detection_cache.detect(pil_image, self.detection_params())
 
     def request_detection_update(self):
         """Debounces requests to update the detection preview."""
@@ -221,28 +267,37 @@ class ManhwaCropper(ctk.CTk):
 
     def redraw_canvas(self, event=None):
         if not self.original_pil_image: return
-        self.canvas.delete("image")
         iw, ih = self.original_pil_image.size; nw, nh = int(iw * self.zoom_level), int(ih * self.zoom_level)
         cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
         if cw < 2 or ch < 2: return
         self.image_x = min(0, max(cw - nw, self.image_x))
         self.image_y = min(0, max(ch - nh, self.image_y))
-        resized_image = self.original_pil_image.resize((nw, nh), Image.Resampling.LANCZOS)
-        self.display_image_tk = ImageTk.PhotoImage(resized_image)
-        self.canvas.create_image(self.image_x, self.image_y, anchor="nw", image=self.display_image_tk, tags="image")
-        for s in self.selections:
-            new_canvas_coords = self.image_to_canvas_coords(s['image_coords'])
-            self.canvas.coords(s['id'], new_canvas_coords)
+        self.renderer.render(self.original_pil_image, self.zoom_level, self.image_x, self.image_y)
+        if self.box_view is not None and self.box_view[0] == self.zoom_level:
+            # Pan only: every box shifts by the same amount, so one tag move does it.
+            self.canvas_batch.move("selection", self.image_x - self.box_view[1], self.image_y - self.box_view[2])
+        else:
+            canvas_boxes = self.selections.to_canvas(self.zoom_level, self.image_x, self.image_y).tolist()
+            for s, new_canvas_coords in zip(self.selections, canvas_boxes):
+                self.canvas_batch.coords(s['id'], new_canvas_coords)
+        self.box_view = (self.zoom_level, self.image_x, self.image_y)
         self.update_selection_visuals()
 
+    def create_box(self, image_coords):
+        """Draws a selection rectangle at the current view, tagged so all boxes can be moved in one call."""
+        if self.box_view != (self.zoom_level, self.image_x, self.image_y):
+            self.box_view = None # The view changed without a redraw; the next one places every box exactly
+        rect_id = self.canvas.create_rectangle(self.image_to_canvas_coords(image_coords), outline="red", width=2, tags="selection")
+        self.canvas_batch.created(rect_id, "red", 2)
+        return rect_id
+
     def get_selection_at_pos(self, x, y):
-        for s in reversed(self.selections):
-            try:
-                x1, y1, x2, y2 = self.canvas.bbox(s['id'])
-            except TclError:
-                continue
-            h = self.handle_size
-            if len(self.active_selections) <= 1:
+        # Tested in image space against the index, so only boxes near the pointer are looked at.
+        x, y = (x - self.image_x) / self.zoom_level, (y - self.image_y) / self.zoom_level
+        h = self.handle_size / self.zoom_level
+        for s in self.selection_index.hits(x, y, h):
+            x1, y1, x2, y2 = self.selection_index.box(s)
+            if self.selections.active_count() <= 1:
                 if abs(x - x1) < h and abs(y - y1) < h: return s, 'resize-nw'
                 if abs(x - x2) < h and abs(y - y1) < h: return s, 'resize-ne'
                 if abs(x - x1) < h and abs(y - y2) < h: return s, 'resize-sw'
@@ -261,17 +316,18 @@ class ManhwaCropper(ctk.CTk):
         if selection:
             self.save_state_for_undo()
             self.drag_mode = mode
-            if not ctrl_pressed and selection not in self.active_selections:
-                self.active_selections = [selection]
+            if not ctrl_pressed and not self.selections.is_active(selection):
+                self.selections.select_only([selection])
             elif ctrl_pressed:
-                if selection in self.active_selections: self.active_selections.remove(selection)
-                else: self.active_selections.append(selection)
-            self.drag_original_coords.clear()
-            for s in self.active_selections:
-                self.drag_original_coords[s['id']] = s['image_coords']
-                self.canvas.tag_raise(s['id'])
+                self.selections.set_active(selection, not self.selections.is_active(selection))
+            self.drag_original_coords = self.selections.active_coords() # Rows line up with active_selections()
+            self.drag_applied = (0, 0)
+            self.canvas.dtag("active", "active")
+            for s in self.selections.active_selections():
+                self.canvas.addtag_withtag("active", s['id'])
+            self.canvas.tag_raise("active")
         else:
-            if not ctrl_pressed: self.active_selections.clear()
+            if not ctrl_pressed: self.selections.clear_active()
             self.drag_mode = 'new'
             self.new_rect_id = self.canvas.create_rectangle(event.x, event.y, event.x, event.y, outline="cyan", width=2)
         self.update_selection_visuals()
@@ -281,23 +337,24 @@ class ManhwaCropper(ctk.CTk):
         if self.drag_mode == 'new' and self.new_rect_id:
             x1, y1 = self.drag_start_pos
             self.canvas.coords(self.new_rect_id, x1, y1, event.x, event.y)
-        elif self.active_selections:
+        elif self.selections.active_count() and self.drag_original_coords is not None:
             dx_img = (event.x - self.drag_start_pos[0]) / self.zoom_level
             dy_img = (event.y - self.drag_start_pos[1]) / self.zoom_level
             if self.drag_mode == 'move':
-                for s in self.active_selections:
-                    ox1, oy1, ox2, oy2 = self.drag_original_coords[s['id']]
-                    s['image_coords'] = (ox1 + dx_img, oy1 + dy_img, ox2 + dx_img, oy2 + dy_img)
-                    self.canvas.coords(s['id'], self.image_to_canvas_coords(s['image_coords']))
-            elif 'resize' in self.drag_mode and len(self.active_selections) == 1:
-                s = self.active_selections[0]
-                x1, y1, x2, y2 = self.drag_original_coords[s['id']]
+                self.selections.move_active(self.drag_original_coords, dx_img, dy_img) # One array op for all moved boxes
+                # On the canvas they all shift by the same offset: one "active" tag move per frame.
+                dx, dy = event.x - self.drag_start_pos[0], event.y - self.drag_start_pos[1]
+                self.canvas_batch.move("active", dx - self.drag_applied[0], dy - self.drag_applied[1])
+                self.drag_applied = (dx, dy)
+            elif 'resize' in self.drag_mode and self.selections.active_count() == 1:
+                s = self.selections.active_selections()[0]
+                x1, y1, x2, y2 = self.drag_original_coords[0].tolist()
                 if 'n' in self.drag_mode: y1 += dy_img
                 if 's' in self.drag_mode: y2 += dy_img
                 if 'w' in self.drag_mode: x1 += dx_img
                 if 'e' in self.drag_mode: x2 += dx_img
                 s['image_coords'] = (x1, y1, x2, y2)
-                self.canvas.coords(s['id'], self.image_to_canvas_coords(s['image_coords']))
+                self.canvas_batch.coords(s['id'], self.image_to_canvas_coords(s['image_coords']))
     
     def on_mouse_release(self, event):
         if self.drag_mode == 'new' and self.new_rect_id:
@@ -308,27 +365,32 @@ class ManhwaCropper(ctk.CTk):
                 final_canvas_coords = (min(canvas_coords[0], canvas_coords[2]), min(canvas_coords[1], canvas_coords[3]),
                                        max(canvas_coords[0], canvas_coords[2]), max(canvas_coords[1], canvas_coords[3]))
                 self.canvas.coords(self.new_rect_id, final_canvas_coords)
-                new_selection = {'id': self.new_rect_id, 'image_coords': self.canvas_to_image_coords(final_canvas_coords)}
-                self.selections.append(new_selection)
-                self.active_selections = [new_selection]
+                self.canvas.addtag_withtag("selection", self.new_rect_id)
+                self.canvas_batch.created(self.new_rect_id, "cyan", 2)
                 self.save_state_for_undo()
-        elif self.active_selections:
-             for s in self.active_selections:
-                 current_canvas_coords = self.canvas.coords(s['id'])
-                 normalized_canvas = (min(current_canvas_coords[0], current_canvas_coords[2]), min(current_canvas_coords[1], current_canvas_coords[3]),
-                                      max(current_canvas_coords[0], current_canvas_coords[2]), max(current_canvas_coords[1], current_canvas_coords[3]))
-                 s['image_coords'] = self.canvas_to_image_coords(normalized_canvas)
+                new_selection = self.selections.add(self.new_rect_id, self.canvas_to_image_coords(final_canvas_coords))
+                self.selection_index.add(new_selection)
+                self.selections.select_only([new_selection])
+                self.update_undo_redo_buttons()
+                self.journal_page_edit()
+        elif self.selections.active_count():
+             self.selections.normalize() # A box resized past its opposite edge gets its corners swapped back
+             for s in self.selections.active_selections():
+                 self.canvas_batch.coords(s['id'], self.image_to_canvas_coords(s['image_coords']))
+                 self.selection_index.update(s) # Deferred from the drag, where nothing hit-tests
              self.update_undo_redo_buttons()
-        self.drag_mode = None; self.drag_start_pos = None; self.new_rect_id = None; self.drag_original_coords.clear()
+             self.journal_page_edit()
+        self.history.commit(self.selections) # Ends the drag so a quick follow-up drag can merge into it
+        self.drag_mode = None; self.drag_start_pos = None; self.new_rect_id = None; self.drag_original_coords = None
         self.update_selection_visuals()
 
     def on_mouse_move(self, event):
         if self.drag_mode: return
         selection, mode = self.get_selection_at_pos(event.x, event.y)
         new_cursor = 'left_ptr'
-        if len(self.active_selections) > 1 and mode == 'move':
+        if self.selections.active_count() > 1 and mode == 'move':
             new_cursor = 'fleur'
-        elif len(self.active_selections) == 1 and mode:
+        elif self.selections.active_count() == 1 and mode:
              cursors = {'move': 'fleur', 'resize-n': 'sb_v_double_arrow', 'resize-s': 'sb_v_double_arrow',
                         'resize-e': 'sb_h_double_arrow', 'resize-w': 'sb_h_double_arrow',
                         'resize-nw': 'size_nw_se', 'resize-se': 'size_nw_se',
@@ -338,26 +400,52 @@ class ManhwaCropper(ctk.CTk):
             self.canvas.config(cursor=new_cursor)
             
     def batch_detect_all(self):
-        if not self.image_paths: return
+        if not self.image_paths or self.batch_detector.is_running(): return
         self.detected_panels_per_image = []
-        self.status_label.configure(text="Batch detecting on all pages...")
-        self.update()
-        original_idx = self.current_image_index
-        for idx, path in enumerate(self.image_paths):
-            self.status_label.configure(text=f"Detecting on page {idx + 1}/{len(self.image_paths)}...")
-            self.update_idletasks()
-            temp_image = Image.open(path).convert("RGB")
-            boxes = self._run_detection_logic(temp_image)
-            self.detected_panels_per_image.append(boxes)
-        self.current_image_index = original_idx
-        self.in_batch_review_mode = True
-        self.batch_review_index = 0
-        self.start_batch_review()
+        self.batch_errors, self.batch_cached = [], 0
+        self.status_label.configure(text=f"Batch detecting on all pages ({self.batch_detector.max_workers} workers)...")
+        self.batch_detect_btn.configure(state="disabled")
+        self.detect_button.configure(state="disabled")
+        self.batch_detector.start(self.image_paths, self.detection_params())
+        self.after(100, self.poll_batch_detection)
+
+    def poll_batch_detection(self):
+        """Drains progress messages from the worker pool without blocking the UI."""
+        for message in self.batch_detector.poll():
+            kind = message[0]
+            if kind == "cached":
+                self.batch_cached = message[1]
+            elif kind == "progress":
+                _, done, total = message
+                cached = f" ({self.batch_cached} unchanged, from cache)" if self.batch_cached else ""
+                self.status_label.configure(text=f"Detecting... {done}/{total} pages done{cached}")
+            elif kind == "error":
+                self.batch_errors.append(message[2])
+            elif kind == "done":
+                self.detected_panels_per_image = message[1]
+                self.in_batch_review_mode = True
+                self.batch_review_index = 0
+                self.settle_approvals()
+                self.journal = SessionJournal(self.output_directory)
+                self.journal.start(self.image_paths, self.detected_panels_per_image, self.crop_counter)
+                self.start_batch_review()
+                if self.batch_errors:
+                    self.status_label.configure(text=f"Detection failed on {len(self.batch_errors)} page(s): {self.batch_errors[0]}")
+                return
+        if self.batch_detector.is_running() or not self.batch_detector.messages.empty():
+            self.after(100, self.poll_batch_detection)
+        else:
+            self.update_button_states()
 
     def start_batch_review(self):
         if self.batch_review_index >= len(self.image_paths):
             self.status_label.configure(text="✅ Batch review complete.")
             self.in_batch_review_mode = False
+            if self.journal:
+                # "done" goes in after the last approved page's crops, see journal_approvals.
+                self.pending_approvals.append((self.journal, None, None, []))
+                self.journal = None
+                self.journal_approvals()
             self.clear_selections(save_state=False)
             self.update_button_states()
             return
@@ -366,38 +454,104 @@ class ManhwaCropper(ctk.CTk):
         self.update()
         panels_for_this_page = self.detected_panels_per_image[self.batch_review_index]
         for image_coords in panels_for_this_page:
-            canvas_coords = self.image_to_canvas_coords(image_coords)
-            rect_id = self.canvas.create_rectangle(canvas_coords, outline="red", width=2)
-            self.selections.append({'id': rect_id, 'image_coords': image_coords})
-        self.active_selections = list(self.selections)
+            self.selections.add(self.create_box(image_coords), image_coords)
+        self.selection_index.rebuild(self.selections)
+        self.selections.select_all()
         self.update_selection_visuals()
         self.status_label.configure(text=f"Reviewing page {self.batch_review_index + 1}/{len(self.image_paths)}. Adjust and approve.")
         self.update_button_states()
 
     def approve_and_next(self):
         if self.approve_btn.cget("state") == "disabled": return
-        self.save_current_page_crops(show_status=False)
+        futures = self.save_current_page_crops(show_status=False)
+        if self.journal:
+            self.pending_approvals.append((self.journal, self.batch_review_index, self.crop_counter, futures))
+            self.journal_approvals()
         self.batch_review_index += 1
         self.start_batch_review()
 
+    def journal_approvals(self):
+        """
+        Journals approved pages in order once all of their crops are on disk, so a crash while
+        exports are queued resumes at the first page whose panels may be missing.
+        """
+        while self.pending_approvals and all(f.done() for f in self.pending_approvals[0][3]):
+            journal, index, crop_counter, _ = self.pending_approvals.pop(0)
+            if index is None: journal.finish()
+            else: journal.record_approve(index, crop_counter)
+
+    def settle_approvals(self):
+        """Waits for queued crops and journals every approved page. Call before starting a journal."""
+        self.export_queue.flush()
+        self.journal_approvals()
+
     def save_current_page_crops(self, show_status=True):
-        if not self.selections: return
-        self.selections.sort(key=lambda s: (s['image_coords'][1], s['image_coords'][0]))
-        if not self.output_directory and not self.prompt_for_output_directory(): return
-        saved_count = 0
-        for s in self.selections:
-            img_w, img_h = self.original_pil_image.size
-            x1, y1, x2, y2 = s['image_coords']
-            x1, y1, x2, y2 = max(0, x1), max(0, y1), min(img_w, x2), min(img_h, y2)
-            if x1 < x2 and y1 < y2:
-                cropped_image = self.original_pil_image.crop((x1, y1, x2, y2))
-                save_path = os.path.join(self.output_directory, f"panel_{self.crop_counter:03d}.png")
-                cropped_image.save(save_path, "PNG")
-                self.crop_counter += 1
-                saved_count += 1
+        """Queues the page's panels for export, returns their futures."""
+        if not self.selections or self.cutting_strip: return []
+        self.selections.sort_reading_order()
+        self.selection_index.rebuild(self.selections) # Stacking order follows the store
+        if not self.output_directory and not self.prompt_for_output_directory(): return []
+        futures = []
+        profile = self.export_profile()
+        boxes, inside = self.selections.clamped(*self.original_pil_image.size)
+        for box in boxes[inside].tolist():
+            # The panel number is taken now, the crop is encoded and written by the export queue.
+            save_path = os.path.join(self.output_directory, profile.filename(self.crop_counter))
+            futures.append(self.export_queue.submit(self.original_pil_image, tuple(box), save_path, profile))
+            self.crop_counter += 1
         if show_status:
-            self.status_label.configure(text=f"Saved {saved_count} panels for page {self.current_image_index + 1}.")
+            self.status_label.configure(text=f"Saving {len(futures)} panels for page {self.current_image_index + 1}...")
+        self.export_queue.watch()
+        return futures
+
+    def export_profile(self):
+        """The codec picked in the settings window, with the optional fit-to-height downscale."""
+        return EXPORT_PROFILES[self.export_format].with_max_height(self.export_max_height)
+
+    def report_exports(self, written, errors, pending):
+        """Reports background exports unless a batch review owns the status bar; failures always show."""
+        self.journal_approvals()
+        if pending:
+            if not self.in_batch_review_mode:
+                self.status_label.configure(text=ExportQueue.status_text(written, errors, pending))
+        elif errors:
+            self.status_label.configure(text=f"⚠ {len(errors)} panel(s) failed to save: {errors[0]}")
+        elif not self.in_batch_review_mode:
+            self.status_label.configure(text=f"Saved {written} panels.")
     
+    def cut_tall_strip(self):
+        """Detects and saves every panel of one huge stitched strip without ever loading it whole."""
+        if self.strip_cutter.is_running(): return
+        path = filedialog.askopenfilename(title="Select Tall Strip", filetypes=[("Image Files", "*.png *.jpg *.jpeg *.webp *.tif *.tiff")])
+        if not path: return
+        if not self.output_directory and not self.prompt_for_output_directory(): return
+        # Band-by-band detection always uses the contour engine.
+        self.strip_cutter.start(path, self.output_directory, self.crop_counter, self.detection_params(), self.export_profile())
+        self.cutting_strip = True
+        self.cut_strip_button.configure(state="disabled")
+        self.update_button_states()
+        self.update_selection_visuals() # Saving waits for the strip: it numbers from crop_counter too
+        self.status_label.configure(text=f"Detecting panels in {os.path.basename(path)} band by band...")
+        self.after(100, self.poll_strip_cut)
+
+    def poll_strip_cut(self):
+        for message in self.strip_cutter.poll():
+            kind = message[0]
+            if kind == "detected":
+                self.status_label.configure(text=f"Found {message[1]} panels, writing crops...")
+            elif kind == "done":
+                self.crop_counter += len(message[1])
+                self.status_label.configure(text=f"Saved {len(message[1])} panels from the strip.")
+            else:
+                self.status_label.configure(text=f"⚠ Strip cutting failed: {message[1]}")
+        if self.strip_cutter.is_running() or not self.strip_cutter.messages.empty():
+            self.after(100, self.poll_strip_cut)
+        else:
+            self.cutting_strip = False
+            self.cut_strip_button.configure(state="normal")
+            self.update_button_states()
+            self.update_selection_visuals()
+
     def run_auto_detect_single_page(self, event=None):
         if not self.original_pil_image or self.detect_button.cget("state") == "disabled": return
         self.save_state_for_undo()
@@ -406,38 +560,47 @@ class ManhwaCropper(ctk.CTk):
         self.update()
         boxes = self._run_detection_logic(self.original_pil_image)
         for image_coords in boxes:
-            canvas_coords = self.image_to_canvas_coords(image_coords)
-            rect_id = self.canvas.create_rectangle(canvas_coords, outline="red", width=2)
-            self.selections.append({'id': rect_id, 'image_coords': image_coords})
+            self.selections.add(self.create_box(image_coords), image_coords)
+        self.selection_index.rebuild(self.selections)
         self.status_label.configure(text=f"Detected {len(self.selections)} panels.")
         self.update_undo_redo_buttons()
+        self.journal_page_edit()
 
     def clear_selections(self, update_status=True, save_state=True):
         if save_state and self.selections: self.save_state_for_undo()
-        for s in self.selections:
-            self.canvas.delete(s['id'])
+        self.canvas.delete("selection")
+        self.canvas_batch.reset()
         self.selections.clear()
-        self.active_selections.clear()
+        self.selection_index.clear()
         if update_status: self.status_label.configure(text="Selections cleared.")
         self.update_selection_visuals()
         self.update_undo_redo_buttons()
     
     def delete_selection(self):
-        if not self.active_selections: return
+        if not self.selections.active_count(): return
         self.save_state_for_undo()
-        for s in list(self.active_selections):
+        for s in self.selections.active_selections():
             self.canvas.delete(s['id'])
-            if s in self.selections: self.selections.remove(s)
-        self.active_selections.clear()
+            self.canvas_batch.forget(s['id'])
+            self.selections.remove(s)
+            self.selection_index.remove(s)
         self.update_selection_visuals()
         self.update_undo_redo_buttons()
+        self.journal_page_edit()
+
+    def journal_page_edit(self):
+        """Appends the reviewed page's current boxes to the session journal."""
+        if self.journal and self.in_batch_review_mode:
+            self.journal.record_page(self.batch_review_index, self.selections.boxes().tolist())
 
     def load_and_display_image(self):
         self.clear_selections(save_state=False)
-        self.undo_stack.clear(); self.redo_stack.clear()
+        self.history.clear()
         self.update_undo_redo_buttons()
         path = self.image_paths[self.current_image_index]
-        self.original_pil_image = Image.open(path).convert("RGB")
+        self.original_pil_image = self.page_cache.get(path)
+        self.page_cache.prefetch(self.image_paths, self.current_image_index)
+        self.renderer.set_image(self.original_pil_image) # Builds the zoom pyramid once per page
         self.after(10, self.fit_image_to_canvas)
         self.update_button_states()
         self.update_status_label()
@@ -459,7 +622,7 @@ class ManhwaCropper(ctk.CTk):
         self.next_button.configure(state=nav_state if self.current_image_index < len(self.image_paths) - 1 else "disabled")
         self.batch_detect_btn.configure(state="normal" if has_images else "disabled")
         self.detect_button.configure(state="normal" if has_images else "disabled")
-        self.approve_btn.configure(state="normal" if self.in_batch_review_mode else "disabled")
+        self.approve_btn.configure(state="normal" if self.in_batch_review_mode and not self.cutting_strip else "disabled")
 
     def open_settings(self):
         if self.settings_window is None or not self.settings_window.winfo_exists():
@@ -467,44 +630,49 @@ class ManhwaCropper(ctk.CTk):
         self.settings_window.focus()
 
     def save_state_for_undo(self): 
-        self.undo_stack.append([s.copy() for s in self.selections])
-        self.redo_stack.clear()
+        self.history.checkpoint(self.selections) # Call before the edit; history.commit() or the next checkpoint closes it
         self.update_undo_redo_buttons()
 
     def undo_action(self, event=None):
-        if not self.undo_stack: return
-        self.redo_stack.append([s.copy() for s in self.selections])
-        self.clear_selections(save_state=False, update_status=False)
-        self.selections = self.undo_stack.pop()
-        for s in self.selections:
-            s['id'] = self.canvas.create_rectangle(self.image_to_canvas_coords(s['image_coords']), outline="red", width=2)
-        self.redraw_canvas()
-        self.update_undo_redo_buttons()
+        self.apply_history_changes(self.history.undo(self.selections))
 
     def redo_action(self, event=None):
-        if not self.redo_stack: return
-        self.undo_stack.append([s.copy() for s in self.selections])
-        self.clear_selections(save_state=False, update_status=False)
-        self.selections = self.redo_stack.pop()
-        for s in self.selections:
-            s['id'] = self.canvas.create_rectangle(self.image_to_canvas_coords(s['image_coords']), outline="red", width=2)
-        self.redraw_canvas()
+        self.apply_history_changes(self.history.redo(self.selections))
+
+    def apply_history_changes(self, changes):
+        """Touches only the canvas items an undo/redo step added, removed or moved."""
+        if changes is None: return
+        added, removed, moved = changes
+        for s in removed:
+            self.canvas.delete(s['id'])
+            self.canvas_batch.forget(s['id'])
+            self.selection_index.remove(s)
+        for s in added:
+            s['id'] = self.create_box(s['image_coords'])
+            self.selection_index.add(s)
+        for s in moved:
+            self.canvas_batch.coords(s['id'], self.image_to_canvas_coords(s['image_coords']))
+            self.selection_index.update(s)
+        self.update_selection_visuals()
         self.update_undo_redo_buttons()
+        self.journal_page_edit()
 
     def update_undo_redo_buttons(self):
-        self.undo_button.configure(state="normal" if self.undo_stack else "disabled")
-        self.redo_button.configure(state="normal" if self.redo_stack else "disabled")
+        self.undo_button.configure(state="normal" if self.history.can_undo(self.selections) else "disabled")
+        self.redo_button.configure(state="normal" if self.history.can_redo() else "disabled")
         
     def update_selection_visuals(self):
-        for s in self.selections:
-            if s in self.active_selections:
-                self.canvas.itemconfig(s['id'], outline="cyan", width=3)
+        for s, is_active in zip(self.selections, self.selections.active[:len(self.selections)].tolist()):
+            if is_active:
+                self.canvas_batch.style(s['id'], "cyan", 3)
             else:
-                self.canvas.itemconfig(s['id'], outline="red", width=2)
-        has_active_selection = len(self.active_selections) > 0
+                self.canvas_batch.style(s['id'], "red", 2)
+        has_active_selection = self.selections.active_count() > 0
         has_any_selection = len(self.selections) > 0
         self.delete_button.configure(state="normal" if has_active_selection else "disabled")
-        self.save_page_button.configure(state="normal" if has_any_selection else "disabled")
+        # Panel numbers are handed out on save; a strip cut in progress owns the next ones.
+        can_save = not self.cutting_strip
+        self.save_page_button.configure(state="normal" if has_any_selection and can_save else "disabled")
         
     def on_canvas_resize(self, event):
         self.fit_image_to_canvas()
@@ -521,6 +689,7 @@ class ManhwaCropper(ctk.CTk):
     def on_mouse_wheel(self, event):
         factor = 1.1 if (event.num == 4 or event.delta > 0) else 1/1.1
         self.zoom_level *= factor
+        self.renderer.zooming()
         self.redraw_canvas()
         
     def prompt_for_output_directory(self):
@@ -540,8 +709,26 @@ class ManhwaCropper(ctk.CTk):
             self.image_paths = []
             return
         self.in_batch_review_mode = False
+        if self.offer_resume(): return
         self.load_and_display_image()
 
+    def offer_resume(self):
+        """Offers to continue an unfinished batch review journaled in the output folder."""
+        self.settle_approvals() # An earlier review may still be journaling into this folder
+        journal = SessionJournal(self.output_directory)
+        state = journal.load()
+        if not state or sorted(state['paths']) != self.image_paths: return False
+        if not messagebox.askyesno("Resume Review", f"Resume the unfinished review at page {state['review_index'] + 1}/{len(state['paths'])}?"):
+            return False
+        self.detected_panels_per_image = state['panels']
+        self.batch_review_index, self.crop_counter = state['review_index'], state['crop_counter']
+        self.in_batch_review_mode = True
+        # Rewrite the journal as one snapshot so it does not keep growing across restarts.
+        self.journal = journal
+        journal.start(state['paths'], state['panels'], state['crop_counter'], state['review_index'])
+        self.start_batch_review()
+        return True
+
     def next_image(self):
         if self.next_button.cget("state") == "disabled": return
         if self.current_image_index < len(self.image_paths) - 1:
@@ -554,6 +741,14 @@ class ManhwaCropper(ctk.CTk):
             self.current_image_index -= 1
             self.load_and_display_image()
             
+    def on_close(self):
+        self.batch_detector.cancel()
+        self.export_queue.close()
+        self.journal_approvals() # Every crop is written now
+        self.page_cache.shutdown()
+        if self.journal: self.journal.close()
+        self.destroy()
+
     def update_status_label(self):
         if not self.image_paths: return
         fn = os.path.basename(self.image_paths[self.current_image_index])
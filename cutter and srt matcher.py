@@ -1,10 +1,11 @@
 import customtkinter as ctk
 from tkinter import filedialog, Canvas
-from PIL import Image, ImageTk
 import os
-import cv2
-import numpy as np
-import copy
+from canvas_renderer import TiledRenderer
+from page_cache import PageCache
+from crop_export import ExportQueue
+from panel_detection import DetectionParams, detect
+from edit_history import EditHistory
 import srt # Library for parsing SRT files
 
 # (The DetectionSettingsWindow class remains unchanged)
@@ -37,7 +38,10 @@ class ManhwaCropper(ctk.CTk):
         self.original_pil_image, self.display_image_tk = None, None
         self.zoom_level, self.image_x, self.image_y = 1.0, 0, 0
         self.pan_start_x, self.pan_start_y = 0, 0
-        self.undo_stack, self.redo_stack = [], []
+        self.page_cache = PageCache()
+        self.export_queue = ExportQueue()
+        self.export_queue.attach(self, self.report_exports)
+        self.history = EditHistory() # Boxes are kept in image space under 'image_coords'
         # --- NEW: State for V3 ---
         self.subtitles = []
 
@@ -73,6 +77,7 @@ class ManhwaCropper(ctk.CTk):
 
         self.canvas = Canvas(self, bg="gray20", highlightthickness=0)
         self.canvas.grid(row=1, column=0, sticky="nsew")
+        self.renderer = TiledRenderer(self.canvas)
         self.y_slider = ctk.CTkSlider(self, orientation="vertical", command=self.on_y_slider_move)
         self.y_slider.grid(row=1, column=1, sticky="ns"); self.y_slider.grid_remove()
         self.x_slider = ctk.CTkSlider(self, orientation="horizontal", command=self.on_x_slider_move)
@@ -95,6 +100,7 @@ class ManhwaCropper(ctk.CTk):
         self.canvas.bind("<Button-4>", self.on_mouse_wheel); self.canvas.bind("<Button-5>", self.on_mouse_wheel)
         self.canvas.bind("<ButtonPress-2>", self.on_pan_start); self.canvas.bind("<B2-Motion>", self.on_pan_drag)
         self.canvas.bind("<Configure>", self.on_canvas_resize)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def load_srt(self):
         """Loads and parses an SRT subtitle file."""
@@ -117,32 +123,29 @@ class ManhwaCropper(ctk.CTk):
         
         # --- MODIFIED: Use the progress bar ---
         self.progress_bar.pack(side="right", padx=10, fill="x", expand=True)
-        self.progress_bar.set(0)
         self.status_label.configure(text="Saving...")
-        self.update_idletasks()
         
-        num_selections = len(self.selections)
-        for i, selection in enumerate(self.selections):
-            coords = selection['coords']
-            x1 = (min(coords[0], coords[2]) - self.image_x) / self.zoom_level
-            y1 = (min(coords[1], coords[3]) - self.image_y) / self.zoom_level
-            x2 = (max(coords[0], coords[2]) - self.image_x) / self.zoom_level
-            y2 = (max(coords[1], coords[3]) - self.image_y) / self.zoom_level
+        # --- MODIFIED: Panels are cropped and encoded by the export queue, progress comes from report_exports ---
+        for selection in self.selections:
+            x1, y1, x2, y2 = selection['image_coords']
             
-            cropped_image = self.original_pil_image.crop((x1, y1, x2, y2))
             save_path = os.path.join(self.output_directory, f"panel_{self.crop_counter:03d}.png")
-            cropped_image.save(save_path, "PNG")
+            self.export_queue.submit(self.original_pil_image, (x1, y1, x2, y2), save_path)
             self.crop_counter += 1
-            
-            # Update progress
-            progress = (i + 1) / num_selections
-            self.progress_bar.set(progress)
-            self.update_idletasks()
 
-        self.status_label.configure(text=f"Saved {num_selections} panels!")
         self.clear_selections(update_status=False, save_state=True)
+        self.export_queue.watch()
+
+    def report_exports(self, written, errors, pending):
+        """Moves the progress bar as background exports finish, hides it once the queue is empty."""
+        self.progress_bar.set((written + len(errors)) / (written + len(errors) + pending or 1))
+        if pending: return
+        self.status_label.configure(text=ExportQueue.status_text(written, errors, pending))
         self.progress_bar.pack_forget() # Hide after completion
 
+    def on_close(self):
+        self.export_queue.close(); self.page_cache.shutdown(); self.destroy()
+
     # (The rest of the app's functions are included below without significant changes)
     def open_settings(self):
         if self.settings_window is None or not self.settings_window.winfo_exists(): self.settings_window = DetectionSettingsWindow(self)
@@ -151,46 +154,29 @@ class ManhwaCropper(ctk.CTk):
         if not self.original_pil_image: return
         self.save_state_for_undo(); self.clear_selections(update_status=False, save_state=False)
         self.status_label.configure(text="Detecting panels..."); self.update()
-        open_cv_image = cv2.cvtColor(np.array(self.original_pil_image), cv2.COLOR_RGB2BGR)
-        gray = cv2.cvtColor(open_cv_image, cv2.COLOR_BGR2GRAY)
-        _, thresh = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY)
-        thresh_inv = cv2.bitwise_not(thresh)
-        contours, _ = cv2.findContours(thresh_inv, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        detected_boxes = []
-        img_area = self.original_pil_image.size[0] * self.original_pil_image.size[1]
-        min_contour_area = (self.min_area_perc / 100.0) * img_area
-        for cnt in contours:
-            contour_area = cv2.contourArea(cnt)
-            if contour_area < min_contour_area: continue
-            x, y, w, h = cv2.boundingRect(cnt)
-            if h == 0 or w == 0: continue
-            aspect_ratio = w / h
-            if aspect_ratio > self.max_aspect_ratio or aspect_ratio < (1 / self.max_aspect_ratio): continue
-            hull = cv2.convexHull(cnt); hull_area = cv2.contourArea(hull)
-            if hull_area == 0: continue
-            solidity = float(contour_area) / hull_area
-            if solidity < self.min_solidity: continue
-            detected_boxes.append((x, y, x + w, y + h))
-        detected_boxes.sort(key=lambda b: (b[1], b[0]))
+        # Same detector as the other croppers, without the closing step.
+        params = DetectionParams(self.min_area_perc, self.min_solidity, closing_kernel_size=1, max_aspect_ratio=self.max_aspect_ratio)
+        detected_boxes = detect(self.original_pil_image, params)
         for box in detected_boxes:
-            x1, y1, x2, y2 = box
-            canvas_x1 = (x1 * self.zoom_level) + self.image_x; canvas_y1 = (y1 * self.zoom_level) + self.image_y
-            canvas_x2 = (x2 * self.zoom_level) + self.image_x; canvas_y2 = (y2 * self.zoom_level) + self.image_y
-            rect_id = self.canvas.create_rectangle(canvas_x1, canvas_y1, canvas_x2, canvas_y2, outline="red", width=2)
-            self.selections.append({'id': rect_id, 'coords': (canvas_x1, canvas_y1, canvas_x2, canvas_y2)})
+            rect_id = self.canvas.create_rectangle(*self.image_to_canvas(box), outline="red", width=2)
+            self.selections.append({'id': rect_id, 'image_coords': tuple(box)})
         self.status_label.configure(text=f"Detected {len(self.selections)} panels."); self.update_undo_redo_buttons()
-    def save_state_for_undo(self): self.undo_stack.append(copy.deepcopy(self.selections)); self.redo_stack.clear(); self.update_undo_redo_buttons()
+    def image_to_canvas(self, coords):
+        x1, y1, x2, y2 = coords; z, ox, oy = self.zoom_level, self.image_x, self.image_y
+        return (x1 * z + ox, y1 * z + oy, x2 * z + ox, y2 * z + oy)
+    def canvas_to_image(self, coords):
+        x1, y1, x2, y2 = coords; z, ox, oy = self.zoom_level, self.image_x, self.image_y
+        return ((min(x1, x2) - ox) / z, (min(y1, y2) - oy) / z, (max(x1, x2) - ox) / z, (max(y1, y2) - oy) / z)
+    def save_state_for_undo(self): self.history.checkpoint(self.selections); self.update_undo_redo_buttons()
     def undo_action(self):
-        if not self.undo_stack: return
-        self.redo_stack.append(copy.deepcopy(self.selections)); self.selections = self.undo_stack.pop()
+        if self.history.undo(self.selections) is None: return
         self.redraw_canvas(); self.update_undo_redo_buttons()
     def redo_action(self):
-        if not self.redo_stack: return
-        self.undo_stack.append(copy.deepcopy(self.selections)); self.selections = self.redo_stack.pop()
+        if self.history.redo(self.selections) is None: return
         self.redraw_canvas(); self.update_undo_redo_buttons()
     def update_undo_redo_buttons(self):
-        self.undo_button.configure(state="normal" if self.undo_stack else "disabled")
-        self.redo_button.configure(state="normal" if self.redo_stack else "disabled")
+        self.undo_button.configure(state="normal" if self.history.can_undo(self.selections) else "disabled")
+        self.redo_button.configure(state="normal" if self.history.can_redo() else "disabled")
     def on_x_slider_move(self, value): self.image_x = value; self.redraw_canvas()
     def on_y_slider_move(self, value): self.image_y = value; self.redraw_canvas()
     def on_canvas_resize(self, event): self.update_sliders(); self.redraw_canvas()
@@ -209,7 +195,7 @@ class ManhwaCropper(ctk.CTk):
         zf = 1.1; d = event.delta
         if event.num == 5 or d == -120: self.zoom_level /= zf
         if event.num == 4 or d == 120: self.zoom_level *= zf
-        self.zoom_level = max(0.1, self.zoom_level); self.redraw_canvas()
+        self.zoom_level = max(0.1, self.zoom_level); self.renderer.zooming(); self.redraw_canvas()
     def on_mouse_press(self, event): self.crop_start_x, self.crop_start_y = event.x, event.y; self.current_rect_id = self.canvas.create_rectangle(self.crop_start_x, self.crop_start_y, self.crop_start_x, self.crop_start_y, outline="red", width=2)
     def on_mouse_drag(self, event):
         if self.current_rect_id: self.canvas.coords(self.current_rect_id, self.crop_start_x, self.crop_start_y, event.x, event.y)
@@ -217,17 +203,14 @@ class ManhwaCropper(ctk.CTk):
         if self.current_rect_id:
             self.save_state_for_undo()
             coords = (self.crop_start_x, self.crop_start_y, event.x, event.y)
-            self.selections.append({'id': self.current_rect_id, 'coords': coords})
+            self.selections.append({'id': self.current_rect_id, 'image_coords': self.canvas_to_image(coords)})
             self.current_rect_id = None; self.status_label.configure(text=f"{len(self.selections)} region(s) selected."); self.update_undo_redo_buttons()
     def redraw_canvas(self):
         if not self.original_pil_image: return
-        self.canvas.delete("all")
-        iw, ih = self.original_pil_image.size; nw, nh = int(iw * self.zoom_level), int(ih * self.zoom_level)
-        resized_image = self.original_pil_image.resize((nw, nh), Image.Resampling.LANCZOS)
-        self.display_image_tk = ImageTk.PhotoImage(resized_image)
-        self.canvas.create_image(self.image_x, self.image_y, anchor="nw", image=self.display_image_tk)
+        self.canvas.delete("!image") # Keep the cached image tiles, drop everything else
+        self.renderer.render(self.original_pil_image, self.zoom_level, self.image_x, self.image_y)
         for selection in self.selections:
-            rect_id = self.canvas.create_rectangle(*selection['coords'], outline="red", width=2)
+            rect_id = self.canvas.create_rectangle(*self.image_to_canvas(selection['image_coords']), outline="red", width=2)
             selection['id'] = rect_id
         self.update_sliders()
     def clear_selections(self, update_status=True, save_state=True):
@@ -246,7 +229,10 @@ class ManhwaCropper(ctk.CTk):
         self.image_paths = paths; self.current_image_index = 0; self.crop_counter = 1
         if not self.output_directory and not self.prompt_for_output_directory(): self.image_paths = []; return
         self.load_and_fit_image(); self.update_button_states()
-    def load_and_fit_image(self): path = self.image_paths[self.current_image_index]; self.original_pil_image = Image.open(path); self.after(50, self._fit_image_to_canvas)
+    def load_and_fit_image(self):
+        path = self.image_paths[self.current_image_index]; self.original_pil_image = self.page_cache.get(path)
+        self.page_cache.prefetch(self.image_paths, self.current_image_index)
+        self.renderer.set_image(self.original_pil_image); self.after(50, self._fit_image_to_canvas)
     def _fit_image_to_canvas(self):
         cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
         if cw == 1 or ch == 1: self.after(50, self._fit_image_to_canvas); return
@@ -256,11 +242,11 @@ class ManhwaCropper(ctk.CTk):
         self.redraw_canvas(); self.update_status_label()
     def next_image(self):
         if self.current_image_index < len(self.image_paths) - 1:
-            self.clear_selections(update_status=False, save_state=False); self.undo_stack.clear(); self.redo_stack.clear()
+            self.clear_selections(update_status=False, save_state=False); self.history.clear()
             self.update_undo_redo_buttons(); self.current_image_index += 1; self.load_and_fit_image(); self.update_button_states()
     def prev_image(self):
         if self.current_image_index > 0:
-            self.clear_selections(update_status=False, save_state=False); self.undo_stack.clear(); self.redo_stack.clear()
+            self.clear_selections(update_status=False, save_state=False); self.history.clear()
             self.update_undo_redo_buttons(); self.current_image_index -= 1; self.load_and_fit_image(); self.update_button_states()
     def update_button_states(self):
         self.prev_button.configure(state="normal" if self.current_image_index > 0 else "disabled")
@@ -0,0 +1,59 @@
+import json
+import os
+import sqlite3
+import threading
+
+# --- Persistent detection results ---
+# Bump when a detector change alters boxes for the same pixels and parameters, so stale entries stop matching.
+DETECTOR_VERSION = 1
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".manhwa_cutter", "detections.sqlite3")
+
+class DetectionStore:
+    """
+    SQLite cache of detected boxes keyed by page content hash plus DetectionParams, so reopening
+    a chapter and batch detecting again only runs detection on pages or settings that changed.
+    Boxes from band-by-band detection (`bands=True`) are kept apart from whole-page results,
+    since the two can differ on pages whose panel borders stay open.
+    One store is shared by every chapter; a single file is safe to use from several threads.
+    """
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS detections (digest TEXT, params TEXT, boxes TEXT, PRIMARY KEY (digest, params))")
+        self._db.commit()
+
+    @staticmethod
+    def _params_key(params, bands=False):
+        return json.dumps([DETECTOR_VERSION, *params.key()] + (["bands"] if bands else []))
+
+    # The cache is only an optimization: a locked or broken database means a miss, never a failed batch.
+    def lookup(self, digest, params, bands=False):
+        """Boxes stored for this page and these parameters, or None."""
+        try:
+            with self._lock:
+                row = self._db.execute("SELECT boxes FROM detections WHERE digest = ? AND params = ?", (digest, self._params_key(params, bands))).fetchone()
+        except sqlite3.Error:
+            return None
+        return [tuple(box) for box in json.loads(row[0])] if row else None
+
+    def store(self, digest, params, boxes, bands=False):
+        try:
+            with self._lock:
+                self._db.execute("INSERT OR REPLACE INTO detections VALUES (?, ?, ?)", (digest, self._params_key(params, bands), json.dumps([list(map(int, b)) for b in boxes])))
+                self._db.commit()
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def open_default_store():
+    """The shared per-user store, or None when it cannot be created (detection then just runs uncached)."""
+    try:
+        return DetectionStore()
+    except (OSError, sqlite3.Error):
+        return None
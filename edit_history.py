@@ -0,0 +1,111 @@
+import time
+
+# --- Delta-based undo/redo for selection boxes ---
+class EditHistory:
+    """
+    Undo/redo that stores only the boxes an edit changed, instead of a deep copy of every selection.
+    `checkpoint(selections)` goes where save_state_for_undo used to snapshot: it remembers the current
+    coordinates of each selection (references only). `commit(selections)` ends the edit and keeps
+    {selection: (before, after)} for the changed boxes only (None = box absent); the next
+    checkpoint, undo or redo commits a still-open edit. Undo and redo edit the caller's list and
+    dicts in place and return (added, removed, moved) so only those canvas items need touching.
+    An edit that moves or resizes the same boxes as the previous one, starting within
+    `coalesce_seconds` of its end, merges into that step. The oldest steps are dropped past
+    `max_steps` or an estimated `max_bytes`.
+    """
+    ENTRY_BYTES = 240  # Rough size of one stored (selection, before, after) entry.
+
+    def __init__(self, coords_key="image_coords", max_steps=500, max_bytes=4 * 1024 * 1024, coalesce_seconds=1.0):
+        self.coords_key = coords_key
+        self.max_steps = max_steps
+        self.max_bytes = max_bytes
+        self.coalesce_seconds = coalesce_seconds
+        self._undo, self._redo = [], []  # steps: {'changes': {id(sel): (sel, before, after)}, 'time': t}
+        self._bytes = 0
+        self._pending = None             # {id(sel): (sel, coords)} taken at the last checkpoint
+        self._pending_time = 0.0
+
+    def _snapshot(self, selections):
+        return {id(s): (s, s[self.coords_key]) for s in selections}
+
+    def checkpoint(self, selections):
+        self.commit(selections)
+        self._pending = self._snapshot(selections)
+        self._pending_time = time.monotonic()
+
+    def _diff(self, selections):
+        before, after = self._pending, self._snapshot(selections)
+        changes = {}
+        for key in before.keys() | after.keys():
+            sel, old = before.get(key, (None, None))
+            sel, new = after.get(key, (sel, None))
+            if old != new:
+                changes[key] = (sel, old, new)
+        return changes
+
+    def commit(self, selections):
+        if self._pending is None: return
+        changes = self._diff(selections)
+        self._pending = None
+        if not changes: return
+        self._redo.clear()
+        now = time.monotonic()
+        top = self._undo[-1] if self._undo else None
+        if (top and self._pending_time - top['time'] <= self.coalesce_seconds and top['changes'].keys() == changes.keys()
+                and all(old is not None and new is not None for _, old, new in list(changes.values()) + list(top['changes'].values()))):
+            # Same boxes dragged again right away: keep the first "before", take the latest "after".
+            top['changes'] = {k: (sel, top['changes'][k][1], new) for k, (sel, _, new) in changes.items()}
+            top['time'] = now
+            return
+        self._undo.append({'changes': changes, 'time': now})
+        self._bytes += len(changes) * self.ENTRY_BYTES
+        while self._undo and (len(self._undo) > self.max_steps or self._bytes > self.max_bytes):
+            self._bytes -= len(self._undo.pop(0)['changes']) * self.ENTRY_BYTES
+
+    def _apply(self, step, selections, use_after):
+        added, removed, moved = [], [], []
+        present = {id(s) for s in selections}
+        for key, (sel, before, after) in step['changes'].items():
+            target = after if use_after else before
+            if target is None:
+                if key in present:
+                    selections.remove(sel)
+                    removed.append(sel)
+            else:
+                sel[self.coords_key] = target
+                if key in present: moved.append(sel)
+                else:
+                    selections.append(sel)
+                    added.append(sel)
+        return added, removed, moved
+
+    def undo(self, selections):
+        """Reverts the last step in `selections`; returns (added, removed, moved) or None."""
+        self.commit(selections)
+        if not self._undo: return None
+        step = self._undo.pop()
+        self._bytes -= len(step['changes']) * self.ENTRY_BYTES
+        self._redo.append(step)
+        return self._apply(step, selections, use_after=False)
+
+    def redo(self, selections):
+        self.commit(selections)
+        if not self._redo: return None
+        step = self._redo.pop()
+        step['time'] = 0  # A redone step never absorbs the next edit.
+        self._undo.append(step)
+        self._bytes += len(step['changes']) * self.ENTRY_BYTES
+        return self._apply(step, selections, use_after=True)
+
+    def can_undo(self, selections):
+        """True if there is a step to undo, counting an open edit that already changed something."""
+        return bool(self._undo) or (self._pending is not None and bool(self._diff(selections)))
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self._bytes = 0
+        self._pending = None
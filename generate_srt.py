@@ -1,16 +1,15 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import whisper
-from datetime import timedelta
 import os
 import threading
 import time
+from whisper_pipeline import MODEL_CACHE, load_audio, transcribe_parallel, transcribe_streaming, progress_path, write_srt, SrtJobQueue, find_audio
 
 class WhisperSRTGenerator:
     def __init__(self, master):
         self.master = master
         master.title("Whisper SRT Generator")
-        master.geometry("650x550")
+        master.geometry("650x760")
         
         # Configure styles
         self.style = ttk.Style()
@@ -47,6 +46,7 @@ class WhisperSRTGenerator:
         model_combo = ttk.Combobox(input_frame, textvariable=self.model_var, 
                                   values=["tiny", "base", "small", "medium", "large"], width=15)
         model_combo.grid(row=1, column=1, sticky="w", padx=5)
+        model_combo.bind("<<ComboboxSelected>>", self.preload_model) # NEW: Warm the model while the user picks files
         ttk.Label(input_frame, text="(Larger = more accurate but slower)").grid(row=1, column=2, sticky="w")
         
         # FFmpeg path selection
@@ -55,6 +55,12 @@ class WhisperSRTGenerator:
         ttk.Entry(input_frame, textvariable=self.ffmpeg_path, width=50).grid(row=2, column=1, padx=5)
         ttk.Button(input_frame, text="Browse...", command=self.select_ffmpeg).grid(row=2, column=2)
         
+        # Parallel transcription of long files
+        ttk.Label(input_frame, text="Parallel Workers:").grid(row=3, column=0, sticky="w", pady=5)
+        self.workers_var = tk.IntVar(value=1)
+        ttk.Spinbox(input_frame, from_=1, to=max(1, os.cpu_count() or 1), textvariable=self.workers_var, width=5).grid(row=3, column=1, sticky="w", padx=5)
+        ttk.Label(input_frame, text="(>1 splits at pauses; each worker loads the model)").grid(row=3, column=2, sticky="w")
+        
         # Output Section
         output_frame = ttk.LabelFrame(main_frame, text="Output Settings", padding=10)
         output_frame.pack(fill=tk.X, pady=(0, 15))
@@ -65,6 +71,28 @@ class WhisperSRTGenerator:
         ttk.Entry(output_frame, textvariable=self.srt_path, width=50).grid(row=0, column=1, padx=5)
         ttk.Button(output_frame, text="Save As...", command=self.select_srt).grid(row=0, column=2)
         
+        # Batch queue Section
+        queue_frame = ttk.LabelFrame(main_frame, text="Batch Queue (SRT saved next to each file)", padding=10)
+        queue_frame.pack(fill=tk.X, pady=(0, 15))
+        self.job_queue = SrtJobQueue() # NEW: Many files through one shared model
+        self.job_tree = ttk.Treeview(queue_frame, columns=("file", "status"), show="headings", height=5)
+        self.job_tree.heading("file", text="Audio File")
+        self.job_tree.heading("status", text="Status")
+        self.job_tree.column("file", width=380)
+        self.job_tree.column("status", width=180)
+        self.job_tree.pack(fill=tk.X)
+        queue_buttons = ttk.Frame(queue_frame)
+        queue_buttons.pack(fill=tk.X, pady=(5, 0))
+        ttk.Button(queue_buttons, text="Add Files...", command=self.add_queue_files).pack(side=tk.LEFT)
+        ttk.Button(queue_buttons, text="Add Folder...", command=self.add_queue_folder).pack(side=tk.LEFT, padx=5)
+        self.start_queue_btn = ttk.Button(queue_buttons, text="Start Queue", command=self.start_queue)
+        self.start_queue_btn.pack(side=tk.LEFT)
+        self.retry_btn = ttk.Button(queue_buttons, text="Retry Failed", command=self.retry_queue, state=tk.DISABLED)
+        self.retry_btn.pack(side=tk.LEFT, padx=5)
+        ttk.Label(queue_buttons, text="Workers:").pack(side=tk.LEFT, padx=(10, 0))
+        self.queue_workers_var = tk.IntVar(value=2)
+        ttk.Spinbox(queue_buttons, from_=1, to=8, textvariable=self.queue_workers_var, width=4).pack(side=tk.LEFT, padx=5)
+        
         # Progress Section
         progress_frame = ttk.LabelFrame(main_frame, text="Progress", padding=10)
         progress_frame.pack(fill=tk.X, pady=(0, 15))
@@ -123,6 +151,16 @@ class WhisperSRTGenerator:
         self.log_text.see(tk.END)
         self.status_var.set(message)
     
+    def preload_model(self, event=None):
+        """Starts loading the chosen model in the background so Generate starts transcribing at once."""
+        size = self.model_var.get()
+        if MODEL_CACHE.is_loaded(size): return
+        self.log_message(f"Preloading {size} model...")
+        def on_ready(size, error):
+            message = f"Could not preload {size} model: {error}" if error else f"{size} model ready"
+            self.master.after(0, self.log_message, message)
+        MODEL_CACHE.preload(size, on_ready)
+    
     def clear_log(self):
         """Clear the log area"""
         self.log_text.config(state=tk.NORMAL)
@@ -164,6 +202,68 @@ class WhisperSRTGenerator:
             self.srt_path.set(path)
             self.log_message(f"Output will be saved to: {path}")
     
+    # --- Batch queue ---
+    def add_queue_files(self):
+        paths = filedialog.askopenfilenames(filetypes=[("Audio Files", "*.mp3 *.wav *.m4a *.flac *.ogg *.aac"), ("All Files", "*.*")])
+        if paths: self.add_to_queue(paths)
+    
+    def add_queue_folder(self):
+        folder = filedialog.askdirectory(title="Select Folder of Audio Files")
+        if folder: self.add_to_queue(find_audio(folder))
+    
+    def add_to_queue(self, paths):
+        added = self.job_queue.add(paths)
+        for index in range(len(self.job_queue.jobs) - added, len(self.job_queue.jobs)):
+            job = self.job_queue.jobs[index]
+            self.job_tree.insert("", tk.END, iid=str(index), values=(os.path.basename(job['path']), job['status']))
+        self.log_message(f"Queued {added} file(s), {len(self.job_queue.jobs)} in the queue")
+    
+    def start_queue(self, retry=False):
+        if self.job_queue.is_running(): return
+        if not self.job_queue.jobs:
+            messagebox.showerror("Error", "Add audio files or a folder to the queue first")
+            return
+        self.use_ffmpeg_path()
+        workers, model_size = max(1, self.queue_workers_var.get()), self.model_var.get()
+        if retry:
+            self.job_queue.retry_failed(model_size, workers)
+        else:
+            self.job_queue.start(model_size, workers)
+        self.start_queue_btn.config(state=tk.DISABLED)
+        self.retry_btn.config(state=tk.DISABLED)
+        self.log_message(f"Running queue with {workers} worker(s) on the {model_size} model...")
+        self.master.after(200, self.poll_queue)
+    
+    def retry_queue(self):
+        self.start_queue(retry=True)
+    
+    def poll_queue(self):
+        """Mirrors job status changes into the list without blocking the UI."""
+        for message in self.job_queue.poll():
+            if message[0] == "status":
+                job = self.job_queue.jobs[message[1]]
+                status = f"failed: {job['error']}" if job['status'] == "failed" else job['status']
+                if job['status'] == "transcribing": status += f" {job['progress']:.0%}"
+                self.job_tree.set(str(message[1]), "status", status)
+                if job['status'] in ("done", "failed"):
+                    self.log_message(f"{os.path.basename(job['path'])}: {status}")
+            elif message[0] == "finished":
+                done = sum(job['status'] == "done" for job in self.job_queue.jobs)
+                self.log_message(f"Queue finished: {done} done, {message[1]} failed")
+                self.start_queue_btn.config(state=tk.NORMAL)
+                self.retry_btn.config(state=tk.NORMAL if message[1] else tk.DISABLED)
+                return
+        self.master.after(200, self.poll_queue)
+    
+    def use_ffmpeg_path(self):
+        """Puts the chosen FFmpeg folder on PATH (once) for Whisper's audio decoding."""
+        ffmpeg_path = self.ffmpeg_path.get()
+        if not ffmpeg_path: return
+        folder = os.path.dirname(ffmpeg_path)
+        if folder not in os.environ["PATH"].split(os.pathsep):
+            os.environ["PATH"] += os.pathsep + folder
+        self.log_message(f"Using FFmpeg from: {ffmpeg_path}")
+    
     def start_generation(self):
         """Start the SRT generation in a separate thread"""
         # Validate inputs
@@ -196,47 +296,38 @@ class WhisperSRTGenerator:
             audio_path = self.audio_path.get()
             srt_path = self.srt_path.get()
             model_size = self.model_var.get()
-            ffmpeg_path = self.ffmpeg_path.get() if self.ffmpeg_path.get() else None
+            workers = max(1, self.workers_var.get())
             
             # Set FFmpeg path if provided
-            if ffmpeg_path:
-                os.environ["PATH"] += os.pathsep + os.path.dirname(ffmpeg_path)
-                self.log_message(f"Using FFmpeg from: {ffmpeg_path}")
-            
-            # Load model
-            self.log_message(f"Loading {model_size} model...")
-            model = whisper.load_model(model_size)
-            
-            # Create a progress indicator thread
-            self.progress_bar.config(mode='indeterminate')
-            self.progress_bar.start(10)
-            
-            # Transcribe audio
-            self.log_message("Transcribing audio... (This may take several minutes)")
-            result = model.transcribe(
-                audio_path,
-                word_timestamps=True,
-                fp16=False,  # Disable GPU acceleration for stability
-                task="transcribe",
-                verbose=False
-            )
-            
-            # Stop the progress indicator
-            self.progress_bar.stop()
-            self.progress_bar.config(mode='determinate')
-            self.progress_var.set(50)  # Mark as 50% complete
+            self.use_ffmpeg_path()
             
-            # Generate SRT file
-            self.log_message("Generating SRT file...")
-            with open(srt_path, "w", encoding="utf-8") as srt_file:
-                for i, segment in enumerate(result["segments"]):
-                    start = timedelta(seconds=segment["start"])
-                    end = timedelta(seconds=segment["end"])
-                    start_str = str(start).replace(".", ",")[:11]  # Format to HH:MM:SS,mmm
-                    end_str = str(end).replace(".", ",")[:11]
-                    text = segment["text"].strip()
-                    
-                    srt_file.write(f"{i+1}\n{start_str} --> {end_str}\n{text}\n\n")
+            if workers > 1:
+                # NEW: Pause-aligned chunks on worker processes, stitched back on one timeline
+                self.log_message(f"Transcribing in parallel on {workers} workers ({model_size} model each)...")
+                def on_progress(done, total):
+                    self.progress_var.set(95 * done / total)
+                    self.status_var.set(f"Transcribed {done / 60:.1f} of {total / 60:.1f} minutes")
+                segments = transcribe_parallel(audio_path, model_size, workers, progress=on_progress)
+                
+                # Generate SRT file
+                self.log_message("Generating SRT file...")
+                write_srt(segments, srt_path)
+            else:
+                # NEW: Stream cues into the SRT window by window; progress follows the audio position
+                audio = load_audio(audio_path)  # NEW: Decoded once per file, then read from the cache
+                if os.path.exists(progress_path(srt_path)):
+                    self.log_message("Found an unfinished SRT for this file, resuming where it stopped...")
+                def on_progress(done, total):
+                    self.progress_var.set(100 * done / total if total else 100)
+                    self.status_var.set(f"Transcribed {done / 60:.1f} of {total / 60:.1f} minutes")
+                
+                # Load model (shared with the batch queue, which may be using it right now)
+                if MODEL_CACHE.is_busy(model_size):
+                    self.log_message(f"Waiting for the batch queue to finish with the {model_size} model...")
+                self.log_message(f"Loading {model_size} model..." if not MODEL_CACHE.is_loaded(model_size) else f"Using loaded {model_size} model")
+                with MODEL_CACHE.using(model_size) as model:
+                    self.log_message("Transcribing audio... (cues are saved as they are transcribed)")
+                    transcribe_streaming(model, audio, srt_path, source=os.path.abspath(audio_path), model_size=model_size, progress=on_progress)
             
             # Success message
             self.progress_var.set(100)
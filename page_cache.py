@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# --- Decoded page cache with background prefetch ---
+class PageCache:
+    """
+    Bounded LRU cache of decoded pages.
+    `prefetch` decodes the next `ahead` and previous `behind` pages on worker threads while the
+    current page is being reviewed, so a page turn is usually a dictionary lookup. The cache is
+    bounded by the total decoded size in bytes rather than by a page count, since one stitched
+    webtoon strip can weigh as much as twenty normal pages.
+    """
+    def __init__(self, max_bytes=768 * 1024 * 1024, ahead=3, behind=1, workers=2, mode=None):
+        self.max_bytes = max_bytes
+        self.ahead, self.behind = ahead, behind
+        self.mode = mode  # e.g. "RGB" to convert on decode; None keeps the file's own mode
+        self._pages = OrderedDict()  # path -> decoded image, least recently used first
+        self._pending = {}           # path -> Future of a decode in progress
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="page-prefetch")
+
+    @staticmethod
+    def _size_of(image):
+        return image.width * image.height * len(image.getbands())
+
+    def _decode(self, path):
+        with Image.open(path) as image:
+            decoded = image.convert(self.mode) if self.mode else image.copy()
+        self._store(path, decoded)
+        return decoded
+
+    def _store(self, path, image):
+        with self._lock:
+            self._pending.pop(path, None)
+            if path in self._pages: return
+            self._pages[path] = image
+            self._bytes += self._size_of(image)
+            # Keep at least the newest page even if it alone is over budget.
+            while self._bytes > self.max_bytes and len(self._pages) > 1:
+                _, old = self._pages.popitem(last=False)
+                self._bytes -= self._size_of(old)
+
+    def get(self, path):
+        """Returns the decoded page, waiting for a prefetch in progress or decoding it right away."""
+        with self._lock:
+            image = self._pages.get(path)
+            if image is not None:
+                self._pages.move_to_end(path)
+                return image
+            future = self._pending.get(path)
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                pass  # Retry synchronously below so the caller sees the real error.
+        return self._decode(path)
+
+    def prefetch(self, paths, index):
+        """Starts decoding the neighbours of `paths[index]` in the background."""
+        neighbours = list(range(index + 1, index + 1 + self.ahead)) + list(range(index - 1, index - 1 - self.behind, -1))
+        for i in neighbours:
+            if not 0 <= i < len(paths): continue
+            path = paths[i]
+            with self._lock:
+                if path in self._pages or path in self._pending: continue
+                self._pending[path] = self._executor.submit(self._decode_quietly, path)
+
+    def _decode_quietly(self, path):
+        try:
+            return self._decode(path)
+        except Exception:
+            with self._lock:
+                self._pending.pop(path, None)
+            raise
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._bytes = 0
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
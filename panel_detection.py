@@ -0,0 +1,480 @@
+import copy
+import time
+import cv2
+import numpy as np
+
+# --- GUI-free panel detection ---
+# Kept free of customtkinter so it can run inside worker processes and scripts.
+# Every cropper window, the batch workers and scripts share this one implementation.
+
+class DetectionParams:
+    """
+    All detection knobs in one picklable object. closing_kernel_size of 1 or less skips the
+    closing, min_solidity 0 and max_aspect_ratio None switch those filters off.
+    """
+    FIELDS = ("min_area_perc", "min_solidity", "closing_kernel_size", "max_aspect_ratio", "coarse_scale", "engine")
+
+    def __init__(self, min_area_perc=0.1, min_solidity=0.85, closing_kernel_size=3, max_aspect_ratio=25, coarse_scale=1.0, engine="contours"):
+        self.min_area_perc = min_area_perc
+        self.min_solidity = min_solidity
+        self.closing_kernel_size = closing_kernel_size
+        self.max_aspect_ratio = max_aspect_ratio
+        self.coarse_scale = coarse_scale
+        self.engine = engine
+
+    def to_dict(self):
+        """Keyword arguments for detect_panels."""
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def key(self):
+        return tuple(getattr(self, name) for name in self.FIELDS)
+
+    def replace(self, **changes):
+        """Copy of these parameters with some fields changed."""
+        params = copy.copy(self)
+        for name, value in changes.items():
+            if name not in self.FIELDS:
+                raise TypeError(f"Unknown detection parameter: {name}")
+            setattr(params, name, value)
+        return params
+
+    def __eq__(self, other):
+        return isinstance(other, DetectionParams) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return "DetectionParams(" + ", ".join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS) + ")"
+
+# What "autocut enhanced.py" always did: plain threshold, 0.1% area, no closing, solidity or aspect check.
+AUTOCUT_PARAMS = DetectionParams(min_area_perc=0.1, min_solidity=0.0, closing_kernel_size=1, max_aspect_ratio=None)
+
+def _aspect_ok(w, h, max_aspect_ratio):
+    if not max_aspect_ratio: return True
+    ar = w / float(h)
+    return 1 / max_aspect_ratio <= ar <= max_aspect_ratio
+
+def _threshold(gray):
+    """Dark pixels (panel content and borders) become 255, the white page background 0."""
+    _, thresh = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY_INV)
+    return thresh
+
+def _close(mask, kernel_size):
+    # Morphological closing helps close small gaps in the borders of panels.
+    if kernel_size <= 1: return mask
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+    return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+# --- Vectorized contour filtering ---
+class _ContourStats:
+    """
+    Bounding boxes of a list of contours, computed with one NumPy reduction over all contour points
+    instead of a boundingRect call per speck. Box size (a contour never covers more than its box)
+    and aspect ratio are rejected with array masks first, so contourArea and the convex hull only
+    run for the few survivors, and each at most once.
+    """
+    def __init__(self, contours):
+        self.contours = contours
+        n = len(self.contours)
+        self.rects = np.zeros((n, 4), np.int64)  # (x, y, w, h), same as cv2.boundingRect
+        if n:
+            lengths = np.fromiter((len(c) for c in self.contours), np.int64, n)
+            points = np.concatenate(self.contours).reshape(-1, 2)
+            starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            x1, y1 = np.minimum.reduceat(points[:, 0], starts), np.minimum.reduceat(points[:, 1], starts)
+            x2, y2 = np.maximum.reduceat(points[:, 0], starts), np.maximum.reduceat(points[:, 1], starts)
+            self.rects[:] = np.stack((x1, y1, x2 - x1 + 1, y2 - y1 + 1), axis=1)
+        self.areas = np.full(n, np.nan)
+        self.hull_areas = np.full(n, np.nan)
+
+    @classmethod
+    def of_mask(cls, mask):
+        """Statistics of the external contours of a binary mask."""
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return cls(contours)
+
+    def filter(self, min_area, min_solidity, max_aspect_ratio=None, among=None):
+        """
+        Keeps contours with at least `min_area` area and `min_solidity` (area over hull area) whose
+        box passes the aspect check, returns (x1, y1, x2, y2) boxes sorted top to bottom.
+        `among` (a boolean array over the contours) limits the filter to some of them.
+        """
+        w, h = self.rects[:, 2], self.rects[:, 3]
+        keep = w * h >= min_area
+        if among is not None:
+            keep &= among
+        if max_aspect_ratio:
+            ar = w / h.astype(np.float64)
+            keep &= (ar <= max_aspect_ratio) & (ar >= 1 / max_aspect_ratio)
+        candidates = np.flatnonzero(keep)
+        for i in candidates[np.isnan(self.areas[candidates])]:
+            self.areas[i] = cv2.contourArea(self.contours[i])
+        candidates = candidates[self.areas[candidates] >= min_area]
+        for i in candidates[np.isnan(self.hull_areas[candidates])]:
+            self.hull_areas[i] = cv2.contourArea(cv2.convexHull(self.contours[i]))
+        hull = self.hull_areas[candidates]
+        solidity = np.divide(self.areas[candidates], hull, out=np.zeros_like(hull), where=hull > 0)
+        boxes = [(int(x), int(y), int(x + w), int(y + h)) for x, y, w, h in self.rects[candidates[solidity >= min_solidity]]]
+        boxes.sort(key=lambda b: (b[1], b[0]))
+        return boxes
+
+def _lap(timings, stage, start):
+    """Adds the seconds since `start` to timings[stage] when timing, returns the new start."""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + now - start
+    return now
+
+def filter_panel_mask(mask, min_area, min_solidity=0.0, max_aspect_ratio=None):
+    """Boxes of the external contours of a binary mask that pass the area, solidity and aspect filters."""
+    return _ContourStats.of_mask(mask).filter(min_area, min_solidity, max_aspect_ratio)
+
+def detect_panels(pil_image, min_area_perc=0.1, min_solidity=0.85, closing_kernel_size=3, max_aspect_ratio=25, coarse_scale=1.0, engine="contours", timings=None):
+    """
+    Runs the OpenCV panel detection on an RGB PIL image, returns image-space boxes.
+    With `coarse_scale` below 1 the candidates are found on a downscaled mask and only their edges
+    are refined at full resolution (see detect_panels_coarse_to_fine).
+    engine="gutters" uses the row-projection splitter for vertical strips instead (see detect_panels_gutters).
+    Pass a dict as `timings` to get the seconds spent per stage of the contour engines added to it.
+    """
+    if engine == "gutters":
+        return detect_panels_gutters(pil_image, min_area_perc, min_solidity, closing_kernel_size, max_aspect_ratio)
+    if coarse_scale < 1.0:
+        return detect_panels_coarse_to_fine(pil_image, min_area_perc, min_solidity, closing_kernel_size, max_aspect_ratio, coarse_scale, timings)
+    start = time.perf_counter()
+    thresh = _threshold(cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2GRAY))
+    start = _lap(timings, "threshold", start)
+    closing = _close(thresh, closing_kernel_size)
+    start = _lap(timings, "closing", start)
+    stats = _ContourStats.of_mask(closing)
+    start = _lap(timings, "contours", start)
+    img_w, img_h = pil_image.size
+    boxes = stats.filter((min_area_perc / 100.0) * (img_w * img_h), min_solidity, max_aspect_ratio)
+    _lap(timings, "filtering", start)
+    return boxes
+
+def detect(pil_image, params=None, timings=None):
+    """Entry point for the GUIs and scripts: detect_panels with a DetectionParams (defaults if None)."""
+    if pil_image.mode != "RGB":
+        pil_image = pil_image.convert("RGB")
+    return detect_panels(pil_image, **(params or DetectionParams()).to_dict(), timings=timings)
+
+# --- Incremental re-detection for the live preview ---
+class DetectionCache:
+    """
+    Remembers the detection stages of the current page, each keyed by what it depends on:
+    the threshold mask by the page, the contour statistics by the closing kernel size (contour
+    and hull areas are filled in as filters first need them). Moving the area, solidity or aspect
+    sliders then only re-filters cached numbers; a new kernel size reuses the threshold mask.
+    The other engines are memoized on their full settings.
+    """
+    def __init__(self):
+        self.image = None
+        self._reset(None)
+
+    def _reset(self, pil_image):
+        self.image = pil_image
+        self._thresh = None
+        self._kernel = None
+        self._contours = None
+        self._results = {}
+
+    def detect(self, pil_image, params=None):
+        """Same result as detect(pil_image, params)."""
+        params = params or DetectionParams()
+        if pil_image is not self.image:
+            self._reset(pil_image)
+        if params.engine != "contours" or params.coarse_scale < 1.0:
+            if params not in self._results:
+                self._results[params] = detect(pil_image, params)
+            return list(self._results[params])
+
+        if self._thresh is None:
+            rgb = pil_image if pil_image.mode == "RGB" else pil_image.convert("RGB")
+            self._thresh = _threshold(cv2.cvtColor(np.array(rgb), cv2.COLOR_RGB2GRAY))
+        if params.closing_kernel_size != self._kernel:
+            self._contours = _ContourStats.of_mask(_close(self._thresh, params.closing_kernel_size))
+            self._kernel = params.closing_kernel_size
+        img_w, img_h = pil_image.size
+        min_area = (params.min_area_perc / 100.0) * (img_w * img_h)
+        return self._contours.filter(min_area, params.min_solidity, params.max_aspect_ratio)
+
+# --- Coarse-to-fine detection ---
+def _coarse_mask(rgb, factor):
+    """
+    Threshold mask of the page averaged over factor x factor cells, made by Pillow's reduce()
+    without ever building the full-resolution array. A cell is set once a black line half a
+    cell long would make it that dark: borders survive (one or two pixel breaks included),
+    lone specks fade.
+    """
+    if factor == 1: return _threshold(np.asarray(rgb.convert("L")))
+    small = np.asarray(rgb.reduce(factor).convert("L"))
+    _, mask = cv2.threshold(small, 255 - 255 // (2 * factor), 255, cv2.THRESH_BINARY_INV)
+    return mask
+
+def _window_mask(rgb, box, kernel_size):
+    """Full-resolution closed threshold mask of one window of the page."""
+    x1, y1, x2, y2 = box
+    k = kernel_size
+    ox1, oy1, ox2, oy2 = max(0, x1 - k), max(0, y1 - k), min(rgb.width, x2 + k), min(rgb.height, y2 + k)
+    gray = cv2.cvtColor(np.asarray(rgb.crop((ox1, oy1, ox2, oy2))), cv2.COLOR_RGB2GRAY)
+    closed = _close(_threshold(gray), kernel_size)
+    return closed[y1 - oy1:y2 - oy1, x1 - ox1:x2 - ox1]
+
+def _outer_row(band, span):
+    """
+    First row of `band` holding foreground connected to its last row inside the `span` columns.
+    The band is flipped/transposed by the caller so that its last row lies inside the panel and
+    every edge looks like a top edge. Specks not touching the panel do not pull the edge out.
+    """
+    count, labels = cv2.connectedComponents(np.ascontiguousarray(band), connectivity=8)
+    seeds = np.unique(labels[-1, span[0]:span[1]])
+    seeds = seeds[seeds > 0]
+    if not seeds.size: return None
+    return int(np.flatnonzero(np.isin(labels, seeds).any(axis=1))[0])
+
+def _refine_box(rgb, box, margin, kernel_size):
+    """Moves each edge of an approximate box to the outermost panel pixel within `margin` of it."""
+    x1, y1, x2, y2 = box
+    w, h = rgb.size
+    mid_x, mid_y = (x1 + x2) // 2, (y1 + y2) // 2
+    wx1, wx2 = max(0, x1 - margin), min(w, x2 + margin)
+    wy1, wy2 = max(0, y1 - margin), min(h, y2 + margin)
+    new = [x1, y1, x2, y2]
+    top = _window_mask(rgb, (wx1, wy1, wx2, max(y1 + 1, min(mid_y, y1 + margin))), kernel_size)
+    row = _outer_row(top, (x1 - wx1, x2 - wx1))
+    if row is not None: new[1] = wy1 + row
+    bottom = _window_mask(rgb, (wx1, min(y2 - 1, max(mid_y, y2 - margin)), wx2, wy2), kernel_size)
+    row = _outer_row(bottom[::-1], (x1 - wx1, x2 - wx1))
+    if row is not None: new[3] = wy2 - row
+    left = _window_mask(rgb, (wx1, wy1, max(x1 + 1, min(mid_x, x1 + margin)), wy2), kernel_size)
+    row = _outer_row(left.T, (y1 - wy1, y2 - wy1))
+    if row is not None: new[0] = wx1 + row
+    right = _window_mask(rgb, (min(x2 - 1, max(mid_x, x2 - margin)), wy1, wx2, wy2), kernel_size)
+    row = _outer_row(right[:, ::-1].T, (y1 - wy1, y2 - wy1))
+    if row is not None: new[2] = wx2 - row
+    return tuple(new)
+
+def detect_panels_coarse_to_fine(pil_image, min_area_perc=0.1, min_solidity=0.85, closing_kernel_size=3, max_aspect_ratio=25, coarse_scale=0.25, timings=None):
+    """
+    Finds candidate panels on a page downscaled by 1 / coarse_scale (threshold, closing, contours
+    and filters all run there), then refines every box edge on full-resolution windows a few
+    coarse cells wide around it. Only those windows are ever converted at full size.
+    Boxes usually match detect_panels to the pixel. Panels separated by gutters narrower than
+    about 2 / coarse_scale pixels may be merged, and ink lighter than mid-gray can drop out of
+    the coarse mask.
+    """
+    start = time.perf_counter()
+    factor = max(1, int(round(1.0 / coarse_scale)))
+    rgb = pil_image if pil_image.mode == "RGB" else pil_image.convert("RGB")
+    coarse = _coarse_mask(rgb, factor)
+    start = _lap(timings, "threshold", start)
+    coarse = _close(coarse, -(-closing_kernel_size // factor))
+    start = _lap(timings, "closing", start)
+
+    img_w, img_h = rgb.size
+    min_area = (min_area_perc / 100.0) * (img_w * img_h) / (factor * factor)
+    # A speck pooled into a cell next to the border inflates a coarse box by up to two cells; the
+    # refine window reaches past that so its inner row lies inside the real panel, not on the speck.
+    margin = 3 * factor + closing_kernel_size
+    candidates = filter_panel_mask(coarse, min_area, min_solidity, max_aspect_ratio)
+    start = _lap(timings, "contours", start)
+    boxes = []
+    for x1, y1, x2, y2 in candidates:
+        approx = (x1 * factor, y1 * factor, min(img_w, x2 * factor), min(img_h, y2 * factor))
+        x1, y1, x2, y2 = _refine_box(rgb, approx, margin, closing_kernel_size)
+        if x2 <= x1 or y2 <= y1: continue
+        if not _aspect_ok(x2 - x1, y2 - y1, max_aspect_ratio): continue
+        boxes.append((x1, y1, x2, y2))
+    boxes.sort(key=lambda b: (b[1], b[0]))
+    _lap(timings, "refining", start)
+    return boxes
+
+# --- Gutter projection (vertical webtoon strips) ---
+def _gray_rows(rgb_image, y1, y2):
+    """Grayscale copy of rows y1:y2 only, so tall strips are never converted in one piece."""
+    return cv2.cvtColor(np.asarray(rgb_image.crop((0, y1, rgb_image.width, y2))), cv2.COLOR_RGB2GRAY)
+
+def detect_panels_gutters(pil_image, min_area_perc=0.1, min_solidity=0.85, closing_kernel_size=3, max_aspect_ratio=25, chunk_rows=2048):
+    """
+    Splits a vertically scrolled strip at its horizontal white gutters using row-wise projection
+    of the threshold mask: O(pixels) NumPy reductions, no contour tracing or hulls.
+    A row counts as ink when more than 0.5% of it is dark, so specks do not split gutters, or when a
+    vertical line (a dark column run of at least 2% of the width) crosses it: the blank rows inside
+    a bordered panel hold only its side borders and must not read as gutters. Gutters thinner than
+    `closing_kernel_size` rows are bridged. Each run of ink rows becomes one panel whose
+    horizontal extent comes from the column projection of that run (columns more than 2% dark). `min_solidity` has no meaning
+    here and is accepted only so both engines share a signature.
+    """
+    rgb = pil_image if pil_image.mode == "RGB" else pil_image.convert("RGB")
+    img_w, img_h = rgb.size
+    row_noise = max(1, img_w // 200)
+    line_rows = max(8, img_w // 50)
+    line_kernel = np.ones((line_rows, 1), np.uint8)
+
+    # Pass 1: ink rows, converting the strip in chunks of rows (with context for the line test).
+    ink_rows = np.empty(img_h, dtype=bool)
+    for y1 in range(0, img_h, chunk_rows):
+        y2 = min(img_h, y1 + chunk_rows)
+        c1, c2 = max(0, y1 - line_rows), min(img_h, y2 + line_rows)
+        dark = (_gray_rows(rgb, c1, c2) <= 240).view(np.uint8)
+        # Opening with a tall 1-px kernel keeps only dark column runs of at least line_rows.
+        lines = cv2.morphologyEx(dark, cv2.MORPH_OPEN, line_kernel)[y1 - c1:y2 - c1].any(axis=1)
+        ink_rows[y1:y2] = (np.count_nonzero(dark[y1 - c1:y2 - c1], axis=1) > row_noise) | lines
+    ink = np.concatenate(([False], ink_rows, [False]))
+    edges = np.flatnonzero(np.diff(ink.astype(np.int8)))
+    runs = list(zip(edges[0::2], edges[1::2]))
+
+    # Bridge gutters that are too thin to be real panel separators.
+    merged = []
+    for start, end in runs:
+        if merged and start - merged[-1][1] < closing_kernel_size:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    # Pass 2: horizontal extent of each run from its column projection.
+    min_area = (min_area_perc / 100.0) * (img_w * img_h)
+    boxes = []
+    for y1, y2 in merged:
+        col_ink = np.count_nonzero(_gray_rows(rgb, y1, y2) <= 240, axis=0)
+        cols = np.flatnonzero(col_ink > max(1, (y2 - y1) // 50))
+        if not cols.size: continue
+        x1, x2 = int(cols[0]), int(cols[-1]) + 1
+        w, h = x2 - x1, int(y2 - y1)
+        if w * h < min_area: continue
+        if not _aspect_ok(w, h, max_aspect_ratio): continue
+        boxes.append((x1, int(y1), x2, int(y2)))
+    return boxes
+
+# --- Band-by-band detection (strips too tall to hold in memory) ---
+def _edge_extent(cnt, row):
+    """Column range of a contour's points on `row`, i.e. where it is cut by a band boundary."""
+    xs = cnt[cnt[:, 0, 1] == row][:, 0, 0]
+    return (int(xs.min()), int(xs.max()))
+
+def _cut_piece(cnt, top):
+    """
+    Part of a panel cut by a band boundary. Its outline is open at the cut, so instead of the
+    contour area it keeps the filled column span of every row (a bordered panel with a white
+    inside is just two lines in the bands it crosses) plus its convex hull points.
+    """
+    x, y, w, h = cv2.boundingRect(cnt)
+    filled = np.zeros((h, w), np.uint8)
+    cv2.drawContours(filled, [cnt - np.array([x, y], dtype=cnt.dtype)], -1, 1, thickness=-1)
+    lo = filled.argmax(axis=1).astype(np.int32) + x
+    hi = (w - 1 - filled[:, ::-1].argmax(axis=1)).astype(np.int32) + x
+    hull = cv2.convexHull(cnt)[:, 0, :] + np.array([0, top], dtype=cnt.dtype)
+    return {'box': [x, top + y, x + w, top + y + h], 'lo': lo, 'hi': hi, 'hull': hull, 'edge': None, 'into': None}
+
+def _absorb(piece, other):
+    """Merges `other` into `piece`: union of boxes and row spans, hull of both."""
+    y1, y2 = min(piece['box'][1], other['box'][1]), max(piece['box'][3], other['box'][3])
+    lo = np.full(y2 - y1, np.iinfo(np.int32).max, np.int32)
+    hi = np.full(y2 - y1, -1, np.int32)
+    for part in (piece, other):
+        rows = slice(part['box'][1] - y1, part['box'][3] - y1)
+        lo[rows] = np.minimum(lo[rows], part['lo'])
+        hi[rows] = np.maximum(hi[rows], part['hi'])
+    piece['lo'], piece['hi'] = lo, hi
+    piece['box'] = [min(piece['box'][0], other['box'][0]), y1, max(piece['box'][2], other['box'][2]), y2]
+    piece['hull'] = cv2.convexHull(np.concatenate((piece['hull'], other['hull'])))[:, 0, :]
+
+def _resolve(piece):
+    while piece is not None and piece['into'] is not None:
+        piece = piece['into']
+    return piece
+
+def _enclosed(box, owner, pieces):
+    """True if `box` lies inside the filled row spans of a stitched piece other than `owner`."""
+    x1, y1, x2, y2 = box
+    for piece in pieces:
+        if piece is owner: continue
+        px1, py1, px2, py2 = piece['box']
+        if x1 < px1 or y1 < py1 or x2 > px2 or y2 > py2: continue
+        rows = slice(y1 - py1, y2 - py1)
+        if (piece['lo'][rows] <= x1).all() and (piece['hi'][rows] >= x2 - 1).all(): return True
+    return False
+
+def detect_panels_in_bands(bands, img_w, img_h, min_area_perc=0.1, min_solidity=0.85, closing_kernel_size=3, max_aspect_ratio=25):
+    """
+    Contour detection over a strip delivered as horizontal bands (see strip_reader.StripReader.bands),
+    so only one band is ever thresholded and closed. Bands must carry `closing_kernel_size` rows of
+    context on each side; closing then matches the full-page mask and contours are traced on the
+    band's own rows only. Panels inside one band are filtered exactly like detect_panels; a contour
+    cut by a band boundary is stitched to every contour it touches across it, and the stitched panel
+    is filtered on its filled row spans and the hull of all its pieces. A band cannot see that its
+    contours sit inside a panel whose outline it only cuts, so boxes inside any stitched panel
+    (passing the filters or not) are dropped at the end, as RETR_EXTERNAL does on the whole page.
+    The result matches detect_panels as long as every panel outline cut by a boundary is closed
+    once the mask is closed. A stitched panel always counts as filled, so where a broken border
+    stays open (closing off, or gaps wider than the kernel) detect_panels sees a thin outline and
+    the artwork inside it, while the bands see one solid panel.
+    """
+    min_area = (min_area_perc / 100.0) * (img_w * img_h)
+    candidates = []  # (box, stitched piece it came from or None)
+    finished = []
+
+    def finish(piece):
+        finished.append(piece)
+        x1, y1, x2, y2 = piece['box']
+        w, h = x2 - x1, y2 - y1
+        area = float(np.maximum(piece['hi'] - piece['lo'] + 1, 0).sum())
+        if area < min_area or w == 0 or h == 0: return
+        hull_area = cv2.contourArea(piece['hull'].reshape(-1, 1, 2))
+        solidity = area / hull_area if hull_area > 0 else 0
+        if solidity < min_solidity: return
+        if not _aspect_ok(w, h, max_aspect_ratio): return
+        candidates.append(((x1, y1, x2, y2), piece))
+
+    open_pieces = []  # pieces cut by the previous band's bottom row, with their 'edge' extent
+    for band in bands:
+        gray = cv2.cvtColor(np.asarray(band.image), cv2.COLOR_RGB2GRAY)
+        closed = _close(_threshold(gray), closing_kernel_size)
+        core = np.ascontiguousarray(closed[band.top - band.image_top:band.bottom - band.image_top])
+        stats = _ContourStats.of_mask(core)
+        last_row = core.shape[0] - 1
+        touches_top = (stats.rects[:, 1] == 0) & bool(open_pieces)
+        touches_bottom = (stats.rects[:, 1] + stats.rects[:, 3] - 1 == last_row) & (band.bottom < img_h)
+        cut = touches_top | touches_bottom
+
+        pieces = []
+        owner = {}  # index in open_pieces -> piece of this band it was stitched into
+        for c in np.flatnonzero(cut):
+            cnt, at_top, at_bottom = stats.contours[c], touches_top[c], touches_bottom[c]
+            piece = _cut_piece(cnt, band.top)
+            if at_bottom:
+                piece['edge'] = _edge_extent(cnt, last_row)
+            pieces.append(piece)
+            if not at_top: continue
+            lo, hi = _edge_extent(cnt, 0)
+            for i, above in enumerate(open_pieces):
+                # 8-connectivity: diagonal neighbours across the boundary count as touching.
+                if above['edge'][0] > hi + 1 or lo > above['edge'][1] + 1: continue
+                current, target = _resolve(piece), _resolve(owner.get(i))
+                if target is None:
+                    _absorb(current, above)
+                    owner[i] = current
+                elif target is not current:
+                    # The piece above already went to another contour here: both are one panel.
+                    _absorb(target, current)
+                    current['into'] = target
+                    if current['edge'] is not None:
+                        edge = target['edge'] or current['edge']
+                        target['edge'] = (min(edge[0], current['edge'][0]), max(edge[1], current['edge'][1]))
+
+        for x1, y1, x2, y2 in stats.filter(min_area, min_solidity, max_aspect_ratio, among=~cut):
+            candidates.append(((x1, band.top + y1, x2, band.top + y2), None))
+        for i, above in enumerate(open_pieces):
+            if i not in owner: finish(above)
+        open_pieces = []
+        for piece in pieces:
+            if piece['into'] is not None: continue
+            if piece['edge'] is not None: open_pieces.append(piece)
+            else: finish(piece)
+    for piece in open_pieces:
+        finish(piece)
+    boxes = [box for box, owner in candidates if not _enclosed(box, owner, finished)]
+    boxes.sort(key=lambda b: (b[1], b[0]))
+    return boxes
@@ -0,0 +1,13 @@
+import queue
+
+# --- Worker -> Tk message passing ---
+# Background workers put tuples on a queue.Queue; the Tk side drains it from an after() callback,
+# so no widget is ever touched off the main thread.
+def drain(messages):
+    """Returns every message queued on `messages` since the last call, without blocking."""
+    drained = []
+    while True:
+        try:
+            drained.append(messages.get_nowait())
+        except queue.Empty:
+            return drained
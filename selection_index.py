@@ -0,0 +1,88 @@
+from collections import defaultdict
+
+# --- Image-space grid index for selection hit-testing ---
+class SelectionIndex:
+    """
+    Uniform grid over image coordinates that answers "which boxes are under this point" by
+    looking only at the cells around it, so hover and click tests on a page with hundreds of
+    detected panels never walk every box or ask Tk for each box's bbox.
+    Boxes are kept in insertion order, which mirrors the order of the app's selection list
+    (later = drawn on top): call `add` when appending, `update` after changing a box's
+    coordinates, `remove` when deleting, and `rebuild` after reordering the list.
+    """
+    def __init__(self, cell_size=256, coords_key="image_coords"):
+        self.cell_size = cell_size
+        self.coords_key = coords_key
+        self._grid = defaultdict(set)  # (cx, cy) -> {id(selection)}
+        self._entries = {}             # id(selection) -> [selection, seq, box, cells]
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _cells(self, x1, y1, x2, y2):
+        c = self.cell_size
+        return [(cx, cy) for cx in range(int(x1 // c), int(x2 // c) + 1) for cy in range(int(y1 // c), int(y2 // c) + 1)]
+
+    @staticmethod
+    def _normalized(coords):
+        x1, y1, x2, y2 = coords
+        return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+    def add(self, selection):
+        self._seq += 1
+        self._place(selection, self._seq)
+
+    def _place(self, selection, seq):
+        key = id(selection)
+        box = self._normalized(selection[self.coords_key])
+        cells = self._cells(*box)
+        for cell in cells:
+            self._grid[cell].add(key)
+        self._entries[key] = [selection, seq, box, cells]
+
+    def remove(self, selection):
+        entry = self._entries.pop(id(selection), None)
+        if entry is None: return
+        for cell in entry[3]:
+            bucket = self._grid[cell]
+            bucket.discard(id(selection))
+            if not bucket: del self._grid[cell]
+
+    def update(self, selection):
+        """Re-files a box after a move or resize, keeping its stacking position."""
+        entry = self._entries.get(id(selection))
+        if entry is None:
+            return self.add(selection)
+        box = self._normalized(selection[self.coords_key])
+        if box == entry[2]: return
+        seq = entry[1]
+        self.remove(selection)
+        self._place(selection, seq)
+
+    def rebuild(self, selections):
+        self.clear()
+        for s in selections:
+            self.add(s)
+
+    def clear(self):
+        self._grid.clear()
+        self._entries.clear()
+        self._seq = 0
+
+    def box(self, selection):
+        """The normalized (x1, y1, x2, y2) the index holds for a selection."""
+        return self._entries[id(selection)][2]
+
+    def hits(self, x, y, tolerance=0.0):
+        """Selections whose box, grown by `tolerance`, contains (x, y); topmost first."""
+        keys = set()
+        for cell in self._cells(x - tolerance, y - tolerance, x + tolerance, y + tolerance):
+            keys.update(self._grid.get(cell, ()))
+        found = []
+        for key in keys:
+            selection, seq, (x1, y1, x2, y2), _ = self._entries[key]
+            if x1 - tolerance <= x <= x2 + tolerance and y1 - tolerance <= y <= y2 + tolerance:
+                found.append((seq, selection))
+        found.sort(key=lambda item: item[0], reverse=True)
+        return [selection for _, selection in found]
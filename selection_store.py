@@ -0,0 +1,167 @@
+import numpy as np
+
+# --- Columnar selection store ---
+class Selection:
+    """
+    Handle to one row of a SelectionStore. `s['image_coords']` and `s['id']` read and write the
+    store's arrays, so EditHistory, SelectionIndex and the journal keep working with it as if it
+    were the old dict. A removed handle keeps its values and can be appended again (undo).
+    """
+    __slots__ = ("store", "row", "_id", "_coords")
+
+    def __init__(self, store, row, rect_id=0, coords=(0.0, 0.0, 0.0, 0.0)):
+        self.store, self.row = store, row
+        self._id, self._coords = rect_id, coords
+
+    def __getitem__(self, key):
+        if self.row is None:
+            return self._id if key == 'id' else self._coords
+        if key == 'id': return int(self.store.ids[self.row])
+        if key == 'image_coords': return tuple(self.store.coords[self.row].tolist())
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if self.row is None:
+            if key == 'id': self._id = value
+            else: self._coords = tuple(value)
+        elif key == 'id': self.store.ids[self.row] = value
+        elif key == 'image_coords': self.store.coords[self.row] = value
+        else: raise KeyError(key)
+
+class SelectionStore:
+    """
+    The page's selection boxes as NumPy columns: image-space coords (n, 4), canvas item ids and
+    an active flag, in stacking order (last = topmost). Iterating yields stable Selection
+    handles, and it supports the list operations the app used on its list of dicts.
+    Bulk work runs on whole columns: canvas transforms, moving every active box during a drag,
+    the reading-order sort, and clamping to the image before export.
+    """
+    def __init__(self, capacity=64):
+        self.coords = np.zeros((capacity, 4), dtype=np.float64)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self._handles = []
+        self._active_count = 0
+
+    # --- List-like access ---
+    def __len__(self):
+        return len(self._handles)
+
+    def __iter__(self):
+        return iter(list(self._handles))
+
+    def __getitem__(self, i):
+        return self._handles[i]
+
+    def __contains__(self, selection):
+        return isinstance(selection, Selection) and selection.store is self and selection.row is not None
+
+    def _grow(self, n):
+        if n <= len(self.ids): return
+        capacity = max(n, 2 * len(self.ids))
+        for name in ("coords", "ids", "active"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add(self, rect_id, image_coords):
+        """Appends a new box on top and returns its handle."""
+        handle = Selection(self, None, rect_id, tuple(image_coords))
+        self.append(handle)
+        return handle
+
+    def append(self, selection):
+        n = len(self._handles)
+        self._grow(n + 1)
+        self.ids[n], self.coords[n], self.active[n] = selection._id, selection._coords, False
+        selection.store, selection.row = self, n
+        self._handles.append(selection)
+
+    def remove(self, selection):
+        if selection not in self: raise ValueError("selection is not in this store")
+        row, n = selection.row, len(self._handles)
+        selection._id, selection._coords = selection['id'], selection['image_coords']
+        self._active_count -= int(self.active[row])
+        for column in (self.coords, self.ids, self.active):
+            column[row:n - 1] = column[row + 1:n]
+        self.active[n - 1] = False
+        del self._handles[row]
+        for handle in self._handles[row:]:
+            handle.row -= 1
+        selection.row = None
+
+    def clear(self):
+        for handle in self._handles:
+            handle._id, handle._coords = handle['id'], handle['image_coords']
+            handle.row = None
+        self._handles = []
+        self.active[:] = False
+        self._active_count = 0
+
+    def boxes(self):
+        """(n, 4) view of the image-space coords, in stacking order."""
+        return self.coords[:len(self._handles)]
+
+    # --- Active flags ---
+    def is_active(self, selection):
+        return selection in self and bool(self.active[selection.row])
+
+    def set_active(self, selection, flag=True):
+        if self.active[selection.row] != flag:
+            self.active[selection.row] = flag
+            self._active_count += 1 if flag else -1
+
+    def select_only(self, selections):
+        self.active[:] = False
+        for s in selections:
+            self.active[s.row] = True
+        self._active_count = len(selections)
+
+    def select_all(self):
+        self.active[:len(self._handles)] = True
+        self._active_count = len(self._handles)
+
+    def clear_active(self):
+        self.active[:] = False
+        self._active_count = 0
+
+    def active_count(self):
+        return self._active_count
+
+    def active_selections(self):
+        return [self._handles[i] for i in np.flatnonzero(self.active[:len(self._handles)])]
+
+    # --- Vectorized bulk operations ---
+    def to_canvas(self, zoom, offset_x, offset_y, active_only=False):
+        """Canvas coords of every box (or every active box) as one (n, 4) array."""
+        boxes = self.boxes()[self.active[:len(self._handles)]] if active_only else self.boxes()
+        return boxes * zoom + (offset_x, offset_y, offset_x, offset_y)
+
+    def active_coords(self):
+        return self.boxes()[self.active[:len(self._handles)]].copy()
+
+    def move_active(self, original_coords, dx, dy):
+        """Sets every active box to its `original_coords` row (from active_coords()) shifted by dx, dy."""
+        self.boxes()[self.active[:len(self._handles)]] = original_coords + (dx, dy, dx, dy)
+
+    def normalize(self):
+        """Puts x1 <= x2 and y1 <= y2 in every box (after dragging an edge past the opposite one)."""
+        boxes = self.boxes()
+        boxes[:] = np.concatenate((np.minimum(boxes[:, :2], boxes[:, 2:]), np.maximum(boxes[:, :2], boxes[:, 2:])), axis=1)
+
+    def sort_reading_order(self):
+        """Reorders rows top-to-bottom, then left-to-right, which is the order panels are numbered in."""
+        n = len(self._handles)
+        if n < 2: return
+        order = np.lexsort((self.coords[:n, 0], self.coords[:n, 1]))
+        for column in (self.coords, self.ids, self.active):
+            column[:n] = column[order]
+        self._handles = [self._handles[i] for i in order]
+        for row, handle in enumerate(self._handles):
+            handle.row = row
+
+    def clamped(self, width, height):
+        """Boxes clipped to the image as an (n, 4) array, plus a mask of the ones still non-empty."""
+        boxes = np.clip(self.boxes(), 0, (width, height, width, height))
+        return boxes, (boxes[:, 0] < boxes[:, 2]) & (boxes[:, 1] < boxes[:, 3])
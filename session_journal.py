@@ -0,0 +1,86 @@
+import json
+import os
+
+# --- Batch review journal ---
+JOURNAL_NAME = ".review_session.jsonl"
+
+class SessionJournal:
+    """
+    Append-only record of a batch review, kept in the output folder so a crash on page 140 of 200
+    loses nothing. One JSON line per event, flushed as it happens:
+      {"op": "start", "paths": [...], "panels": [[box, ...], ...], "crop_counter": n}
+      {"op": "page", "index": i, "boxes": [...]}      # the page's boxes after an edit
+      {"op": "approve", "index": i, "crop_counter": n}
+      {"op": "done"}
+    Every "page" line holds the whole page, so replay never needs older lines of that page, and
+    resuming rewrites the file as a fresh snapshot to keep it short.
+    """
+    def __init__(self, output_directory):
+        self.path = os.path.join(output_directory, JOURNAL_NAME)
+        self._file = None
+
+    def _append(self, entry):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def start(self, image_paths, panels_per_image, crop_counter, review_index=0):
+        """Begins a new journal (replacing any old one) from a full snapshot of the review."""
+        self.close()
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._append({'op': "start", 'paths': list(image_paths), 'crop_counter': crop_counter,
+                      'panels': [[_box(b) for b in boxes] for boxes in panels_per_image]})
+        if review_index:
+            self._append({'op': "approve", 'index': review_index - 1, 'crop_counter': crop_counter})
+
+    def record_page(self, index, boxes):
+        if self._file is not None:
+            self._append({'op': "page", 'index': index, 'boxes': [_box(b) for b in boxes]})
+
+    def record_approve(self, index, crop_counter):
+        if self._file is not None:
+            self._append({'op': "approve", 'index': index, 'crop_counter': crop_counter})
+
+    def finish(self):
+        if self._file is not None:
+            self._append({'op': "done"})
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def load(self):
+        """
+        Replays the journal. Returns {'paths', 'panels', 'review_index', 'crop_counter'} for an
+        unfinished review, or None if there is nothing to resume. A torn last line is ignored.
+        """
+        if not os.path.exists(self.path): return None
+        state = None
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Partially written line from a crash.
+                op = entry.get('op')
+                if op == "start":
+                    state = {'paths': entry['paths'], 'panels': [[tuple(b) for b in p] for p in entry['panels']],
+                             'review_index': 0, 'crop_counter': entry['crop_counter']}
+                elif state is None:
+                    continue
+                elif op == "page" and 0 <= entry['index'] < len(state['panels']):
+                    state['panels'][entry['index']] = [tuple(b) for b in entry['boxes']]
+                elif op == "approve":
+                    state['review_index'] = entry['index'] + 1
+                    state['crop_counter'] = entry['crop_counter']
+                elif op == "done":
+                    state = None
+        if state is None or state['review_index'] >= len(state['paths']): return None
+        return state
+
+def _box(box):
+    # Boxes are float after dragging at non-integer zoom; two decimals are plenty.
+    return [round(float(v), 2) for v in box]
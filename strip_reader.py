@@ -0,0 +1,251 @@
+import io
+import os
+import queue
+import struct
+import threading
+import zlib
+from collections import namedtuple
+from PIL import Image
+
+from panel_detection import DetectionParams, detect_panels_in_bands
+from crop_export import EXPORT_PROFILES, DEFAULT_EXPORT_PROFILE
+from polling import drain
+
+# --- Streaming reader for very tall strips ---
+# A stitched 1000x200000 chapter would otherwise be decoded in one piece and then copied again by
+# np.array / cvtColor. Here only a few horizontal bands are ever held in memory.
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}  # colour type -> samples per pixel
+
+# top/bottom: rows of the strip this band is responsible for.
+# image_top: strip row of the first row of `image`, which also holds context rows around top/bottom.
+Band = namedtuple("Band", "top bottom image_top image")
+
+def _png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+
+class StripReader:
+    """
+    Reads a tall image as horizontal bands with bounded memory.
+    Non-interlaced 8-bit PNGs are truly streamed: IDAT data is inflated incrementally, and each
+    band's filtered scanlines are wrapped in a small stored (uncompressed) PNG, which Pillow
+    unfilters in C. The last decoded row of a band is carried over as an unfiltered first row,
+    so "Up", "Average" and "Paeth" filters keep working across band boundaries.
+    Every other format falls back to a single full decode, cut into bands afterwards.
+    """
+    def __init__(self, path, read_size=1 << 20):
+        self.path = path
+        self.read_size = read_size
+        self._png = self._read_png_header()
+        if self._png:
+            self.width, self.height = self._png['width'], self._png['height']
+        else:
+            with Image.open(path) as image:
+                self.width, self.height = image.size
+
+    @property
+    def is_streaming(self):
+        return self._png is not None
+
+    def _read_png_header(self):
+        """Returns the PNG layout if the file can be streamed, otherwise None."""
+        with open(self.path, "rb") as f:
+            if f.read(8) != PNG_SIGNATURE: return None
+            length, chunk_type = struct.unpack(">I4s", f.read(8))
+            if chunk_type != b"IHDR": return None
+            width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", f.read(length))
+            if bit_depth != 8 or interlace != 0 or color_type not in PNG_CHANNELS: return None
+            f.read(4)
+            extra = []  # PLTE / tRNS chunks the band PNGs need to decode the same way
+            while True:
+                length, chunk_type = struct.unpack(">I4s", f.read(8))
+                if chunk_type == b"IDAT":
+                    idat_offset = f.tell() - 8
+                    break
+                data = f.read(length); f.read(4)
+                if chunk_type in (b"PLTE", b"tRNS"):
+                    extra.append(_png_chunk(chunk_type, data))
+                if chunk_type == b"IEND": return None
+        return {'width': width, 'height': height, 'color_type': color_type, 'extra': b"".join(extra),
+                'stride': width * PNG_CHANNELS[color_type], 'idat_offset': idat_offset}
+
+    def _inflated(self):
+        """
+        Yields the decompressed IDAT stream piece by piece. After priming with next(), send() the
+        most bytes wanted next and the piece yielded is never longer, however well the data packs.
+        """
+        inflater = zlib.decompressobj()
+        limit = yield b""
+        with open(self.path, "rb") as f:
+            f.seek(self._png['idat_offset'])
+            while True:
+                length, chunk_type = struct.unpack(">I4s", f.read(8))
+                if chunk_type == b"IEND": break
+                if chunk_type != b"IDAT":
+                    f.seek(length + 4, os.SEEK_CUR)
+                    continue
+                remaining = length
+                while remaining:
+                    data = f.read(min(self.read_size, remaining))
+                    if not data: raise EOFError(f"Truncated PNG: {self.path}")
+                    remaining -= len(data)
+                    while True:
+                        # Input that did not fit under the limit waits in unconsumed_tail for the next send().
+                        out = inflater.decompress(data, limit)
+                        data, full = inflater.unconsumed_tail, len(out) == limit
+                        if out: limit = yield out
+                        if not data and not full: break
+                f.read(4)
+        tail = inflater.flush()
+        if tail: yield tail
+
+    def _decode_rows(self, scanlines, count, previous_row):
+        """Decodes `count` filtered scanlines through a throwaway stored PNG."""
+        png = self._png
+        rows = count + (1 if previous_row is not None else 0)
+        ihdr = struct.pack(">IIBBBBB", png['width'], rows, 8, png['color_type'], 0, 0, 0)
+        raw = (b"\x00" + previous_row if previous_row is not None else b"") + scanlines
+        data = PNG_SIGNATURE + _png_chunk(b"IHDR", ihdr) + png['extra'] + _png_chunk(b"IDAT", zlib.compress(raw, 0)) + _png_chunk(b"IEND", b"")
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        if previous_row is not None:
+            image = image.crop((0, 1, png['width'], rows))
+        return image
+
+    def _png_blocks(self, block_rows):
+        line = 1 + self._png['stride']
+        pending = bytearray()
+        previous_row = None
+        done = 0
+        inflated = self._inflated()
+        next(inflated)
+        while done < self.height:
+            # Only ask for what completes the current block, so at most one block is ever buffered.
+            count = min(block_rows, self.height - done)
+            try:
+                pending += inflated.send(count * line - len(pending))
+            except StopIteration:
+                break
+            if len(pending) < count * line: continue
+            block = self._decode_rows(bytes(pending), count, previous_row)
+            pending.clear()
+            previous_row = block.crop((0, count - 1, self.width, count)).tobytes()
+            done += count
+            yield block
+        inflated.close()
+        if done < self.height:
+            raise EOFError(f"PNG ended after {done} of {self.height} rows: {self.path}")
+
+    def _fallback_blocks(self, block_rows):
+        with Image.open(self.path) as image:
+            image.load()
+            for top in range(0, self.height, block_rows):
+                yield image.crop((0, top, self.width, min(self.height, top + block_rows)))
+
+    def blocks(self, block_rows):
+        """Yields consecutive, non-overlapping RGB images of up to `block_rows` rows."""
+        source = self._png_blocks(block_rows) if self.is_streaming else self._fallback_blocks(block_rows)
+        for block in source:
+            yield block if block.mode == "RGB" else block.convert("RGB")
+
+    def bands(self, band_rows, context=0):
+        """
+        Yields a Band per `band_rows` rows, each padded with up to `context` rows of its neighbours
+        so filters like morphological closing see the same pixels as on the whole strip.
+        At most three blocks are alive at any time.
+        """
+        blocks = self.blocks(band_rows)
+        current = next(blocks, None)
+        previous_tail = None
+        top = 0
+        while current is not None:
+            following = next(blocks, None)
+            parts = [p for p in (previous_tail, current) if p is not None]
+            if following is not None and context:
+                parts.append(following.crop((0, 0, self.width, min(context, following.height))))
+            image = parts[0] if len(parts) == 1 else self._stack(parts)
+            image_top = top - (previous_tail.height if previous_tail is not None else 0)
+            yield Band(top, top + current.height, image_top, image)
+            previous_tail = current.crop((0, max(0, current.height - context), self.width, current.height)) if context else None
+            top += current.height
+            current = following
+
+    def _stack(self, parts):
+        stacked = Image.new("RGB", (self.width, sum(p.height for p in parts)))
+        y = 0
+        for part in parts:
+            stacked.paste(part, (0, y))
+            y += part.height
+        return stacked
+
+# --- Band-by-band detection and crop export ---
+def detect_strip_panels(path, params=None, band_rows=4096):
+    """
+    Runs contour detection over a tall strip band by band, returns image-space boxes.
+    Only the contour engine works on bands; `engine` and `coarse_scale` are ignored.
+    """
+    params = params or DetectionParams()
+    reader = StripReader(path)
+    bands = reader.bands(band_rows, context=params.closing_kernel_size)
+    return detect_panels_in_bands(bands, reader.width, reader.height, params.min_area_perc, params.min_solidity, params.closing_kernel_size, params.max_aspect_ratio)
+
+def write_strip_crops(path, boxes, save_paths, profile=None, band_rows=4096):
+    """
+    Second pass over the strip: each panel is assembled from the bands it spans and written as
+    soon as its last row has been read, so only the panels crossing the current band are held.
+    """
+    profile = profile or EXPORT_PROFILES[DEFAULT_EXPORT_PROFILE]
+    order = sorted(range(len(boxes)), key=lambda i: boxes[i][1])
+    reader = StripReader(path)
+    open_crops = {}
+    next_box = 0
+    written = []
+    for band in reader.bands(band_rows):
+        while next_box < len(order) and boxes[order[next_box]][1] < band.bottom:
+            i = order[next_box]
+            x1, y1, x2, y2 = boxes[i]
+            open_crops[i] = Image.new("RGB", (x2 - x1, y2 - y1))
+            next_box += 1
+        for i in list(open_crops):
+            x1, y1, x2, y2 = boxes[i]
+            top, bottom = max(y1, band.top), min(y2, band.bottom)
+            if top < bottom:
+                rows = band.image.crop((x1, top - band.image_top, x2, bottom - band.image_top))
+                open_crops[i].paste(rows, (0, top - y1))
+            if y2 <= band.bottom:
+                profile.save(open_crops.pop(i), save_paths[i])
+                written.append(save_paths[i])
+    return written
+
+class StripCutter:
+    """
+    Detects and writes the panels of one tall strip on a background thread.
+    Like BatchDetector, progress is reported through `messages` for the GUI to poll:
+    ("detected", panel_count), ("done", written_paths) or ("error", message).
+    """
+    def __init__(self):
+        self.messages = queue.Queue()
+        self._thread = None
+
+    def start(self, path, output_directory, first_counter, params=None, profile=None, band_rows=4096):
+        if self.is_running(): return
+        self._thread = threading.Thread(target=self._run, args=(path, output_directory, first_counter, params, profile, band_rows), daemon=True)
+        self._thread.start()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self, path, output_directory, first_counter, params, profile, band_rows):
+        try:
+            profile = profile or EXPORT_PROFILES[DEFAULT_EXPORT_PROFILE]
+            boxes = detect_strip_panels(path, params, band_rows)
+            self.messages.put(("detected", len(boxes)))
+            save_paths = [os.path.join(output_directory, profile.filename(first_counter + i)) for i in range(len(boxes))]
+            self.messages.put(("done", write_strip_crops(path, boxes, save_paths, profile, band_rows)))
+        except Exception as e:
+            self.messages.put(("error", f"{os.path.basename(path)}: {e}"))
+
+    def poll(self):
+        """Returns every message received since the last call, without blocking."""
+        return drain(self.messages)
@@ -196,7 +196,7 @@ class EnhancedSubtitleImageMapper:
         folder = filedialog.askdirectory()
         if folder:
             self.image_folder = folder
-            valid_exts = (".png", ".jpg", ".jpeg", ".webp")
+            valid_exts = (".png", ".jpg", ".jpeg", ".webp", ".tif", ".tiff")
             try:
                 self.image_files = sorted(
                     [f for f in os.listdir(folder) if f.lower().endswith(valid_exts)],
@@ -0,0 +1,12 @@
+from detection_store import DetectionStore
+from panel_detection import DetectionParams
+
+def test_band_results_are_stored_apart(tmp_path):
+    store = DetectionStore(str(tmp_path / "detections.sqlite3"))
+    params = DetectionParams()
+    store.store("digest", params, [(0, 0, 10, 10)])
+    assert store.lookup("digest", params, bands=True) is None
+    store.store("digest", params, [(0, 0, 10, 12)], bands=True)
+    assert store.lookup("digest", params) == [(0, 0, 10, 10)]
+    assert store.lookup("digest", params, bands=True) == [(0, 0, 10, 12)]
+    store.close()
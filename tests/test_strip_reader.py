@@ -0,0 +1,46 @@
+import pytest
+
+from benchmark_detection import make_page
+from panel_detection import DetectionParams, detect
+from strip_reader import detect_strip_panels
+
+LAYOUTS = [(0, 800, 8000, "strip"), (1, 800, 8000, "strip"), (2, 1600, 2400, "page")]
+PARAMS = {"defaults": DetectionParams(),
+          "small-area": DetectionParams(min_area_perc=0.01),
+          "no-shape-filters": DetectionParams(min_solidity=0, max_aspect_ratio=None),
+          "wide-kernel": DetectionParams(closing_kernel_size=7)}
+
+@pytest.fixture(scope="module")
+def pages(tmp_path_factory):
+    """Saved synthetic pages, rendered once: {(layout, specks, gaps): (path, image)}."""
+    cache = {}
+    def page(layout, specks, gaps):
+        if (layout, specks, gaps) not in cache:
+            seed, width, height, kind = layout
+            image, _ = make_page(seed, width, height, kind, specks=specks, gaps=gaps)
+            path = str(tmp_path_factory.mktemp("pages") / "page.png")
+            image.save(path)
+            cache[layout, specks, gaps] = (path, image)
+        return cache[layout, specks, gaps]
+    return page
+
+@pytest.mark.parametrize("band_rows", [500, 1000, 3000])
+@pytest.mark.parametrize("specks, gaps", [(0, 0), (400, 3)])
+def test_bands_match_whole_strip(pages, band_rows, specks, gaps):
+    """Band-by-band detection returns exactly what detect() finds on the strip in one piece."""
+    path, image = pages(LAYOUTS[0], specks, gaps)
+    assert detect_strip_panels(path, DetectionParams(), band_rows) == detect(image)
+
+@pytest.mark.parametrize("layout", LAYOUTS, ids=lambda layout: f"{layout[3]}-{layout[0]}")
+@pytest.mark.parametrize("name", PARAMS)
+@pytest.mark.parametrize("specks, gaps", [(0, 0), (400, 3)])
+def test_bands_match_with_other_params(pages, layout, name, specks, gaps):
+    path, image = pages(layout, specks, gaps)
+    assert detect_strip_panels(path, PARAMS[name], 700) == detect(image, PARAMS[name])
+
+@pytest.mark.parametrize("layout", LAYOUTS, ids=lambda layout: f"{layout[3]}-{layout[0]}")
+def test_bands_match_without_closing_on_intact_borders(pages, layout):
+    """With closing off, borders must be unbroken for the bands to match (see detect_panels_in_bands)."""
+    params = DetectionParams(min_area_perc=0.01, min_solidity=0, closing_kernel_size=1, max_aspect_ratio=None)
+    path, image = pages(layout, 400, 0)
+    assert detect_strip_panels(path, params, 700) == detect(image, params)
@@ -0,0 +1,445 @@
+import gc
+import json
+import os
+import queue
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+import numpy as np
+import whisper
+from content_hash import file_digest
+from polling import drain
+
+# --- GUI-free transcription helpers for generate_srt.py ---
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE  # 16 kHz mono, what every Whisper model expects
+TRANSCRIBE_OPTIONS = {'word_timestamps': True, 'fp16': False, 'task': "transcribe", 'verbose': False}
+
+def srt_timestamp(seconds):
+    """HH:MM:SS,mmm for an SRT cue."""
+    ms = int(round(seconds * 1000))
+    hours, ms = divmod(ms, 3_600_000)
+    minutes, ms = divmod(ms, 60_000)
+    secs, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{ms:03d}"
+
+def format_cue(number, segment):
+    return f"{number}\n{srt_timestamp(segment['start'])} --> {srt_timestamp(segment['end'])}\n{segment['text'].strip()}\n\n"
+
+def write_srt(segments, srt_path):
+    with open(srt_path, "w", encoding="utf-8") as srt_file:
+        for i, segment in enumerate(segments):
+            srt_file.write(format_cue(i + 1, segment))
+
+# --- Decoded audio cache ---
+DEFAULT_AUDIO_CACHE = os.path.join(os.path.expanduser("~"), ".manhwa_cutter", "audio_cache")
+
+class AudioCache:
+    """
+    16 kHz mono float32 PCM as ffmpeg decoded it, saved as .npy files named by the source file's
+    content hash, so regenerating with another model size or settings skips ffmpeg and reads
+    the samples straight from disk. Hits are memory-mapped copy-on-write: only the pages a
+    transcription touches are read, and the OS page cache is shared between runs and worker
+    processes. Least recently used files are deleted once the folder passes `max_bytes`.
+    """
+    def __init__(self, directory=DEFAULT_AUDIO_CACHE, max_bytes=4 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest + ".npy")
+
+    def load(self, audio_path):
+        """Samples of `audio_path`, decoding (and caching) only on the first call for its content."""
+        cache_path = self._path(file_digest(audio_path))
+        try:
+            audio = np.load(cache_path, mmap_mode="c")
+        except (OSError, ValueError):
+            audio = None  # Not cached yet, or a damaged file that the save below replaces
+        if audio is not None:
+            try:
+                os.utime(cache_path)  # Recently used, for pruning
+            except OSError:
+                pass  # Read-only cache: still a hit, pruning just sees the old time
+            return audio
+        audio = whisper.load_audio(audio_path)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{cache_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                np.save(f, audio)
+            os.replace(temp_path, cache_path)  # Readers never see a half-written file
+            self.prune(keep=cache_path)
+        except OSError:
+            pass  # A full or read-only disk only costs the next run a decode
+        return audio
+
+    def prune(self, keep=None):
+        try:
+            entries = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith(".npy")]
+            entries = sorted(((os.stat(p).st_mtime, os.path.getsize(p), p) for p in entries), reverse=True)
+        except OSError:
+            return
+        total = 0
+        for _, size, path in entries:
+            total += size
+            if total > self.max_bytes and path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # Still mapped by a running job (Windows); pruned next time
+
+AUDIO_CACHE = AudioCache()
+
+def load_audio(audio_path):
+    """whisper.load_audio through the on-disk decode cache."""
+    return AUDIO_CACHE.load(audio_path)
+
+# --- Warm model cache ---
+# Parameter counts of the official checkpoints; float32 weights on CPU take 4 bytes each.
+MODEL_PARAMETERS = {"tiny": 39e6, "base": 74e6, "small": 244e6, "medium": 769e6, "large": 1550e6}
+
+def _physical_memory():
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullTotalPhys
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, OSError, ValueError):
+        return 8 * 1024 ** 3
+
+def _model_bytes(model):
+    return sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+
+class ModelCache:
+    """
+    Loaded Whisper models kept for the life of the process, keyed by size, so a second generation
+    or the next job in a batch starts transcribing at once. Models are evicted least recently used
+    first whenever loading another would take the cache past `max_bytes` (default: half the
+    machine's RAM); the estimate is checked before loading, so two large models are never
+    resident together unless they fit. Safe to use from several threads: concurrent requests for
+    the same size wait for one load. Whisper installs per-call hooks on a model while it decodes,
+    so transcribe through `using(size)`, which lets one caller at a time use each model.
+    """
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or _physical_memory() // 2
+        self._models = OrderedDict()  # size -> (model, bytes), least recently used first
+        self._loading = {}            # size -> threading.Event set when its load finishes
+        self._in_use = {}             # size -> threading.Lock held while a caller transcribes
+        self._lock = threading.Lock()
+
+    def is_loaded(self, size):
+        with self._lock:
+            return size in self._models
+
+    def get(self, size):
+        """The model for `size`, loading it (and evicting others) if needed."""
+        while True:
+            with self._lock:
+                if size in self._models:
+                    self._models.move_to_end(size)
+                    return self._models[size][0]
+                pending = self._loading.get(size)
+                if pending is None:
+                    pending = self._loading[size] = threading.Event()
+                    break
+            pending.wait()  # Another thread is loading it; take its result (or retry if it failed).
+        try:
+            self._evict(int(MODEL_PARAMETERS.get(size.split(".")[0].split("-")[0], 0) * 4))
+            model = whisper.load_model(size)
+            with self._lock:
+                self._models[size] = (model, _model_bytes(model))
+            self._evict(0)
+            return model
+        finally:
+            with self._lock:
+                del self._loading[size]
+            pending.set()
+
+    @contextmanager
+    def using(self, size):
+        """`with MODEL_CACHE.using(size) as model:` waits until no other caller is using that model."""
+        with self._lock:
+            in_use = self._in_use.setdefault(size, threading.Lock())
+        with in_use:
+            yield self.get(size)
+
+    def is_busy(self, size):
+        with self._lock:
+            return size in self._in_use and self._in_use[size].locked()
+
+    def _evict(self, incoming_bytes):
+        with self._lock:
+            while self._models and sum(b for _, b in self._models.values()) + incoming_bytes > self.max_bytes:
+                # Never the only model left: a model larger than the budget still has to run.
+                if incoming_bytes == 0 and len(self._models) == 1: break
+                self._models.popitem(last=False)
+        gc.collect()
+
+    def preload(self, size, on_ready=None):
+        """Loads `size` on a background thread; `on_ready(size, error)` runs on that thread when done."""
+        def run():
+            try:
+                self.get(size)
+                error = None
+            except Exception as e:
+                error = e
+            if on_ready: on_ready(size, error)
+        threading.Thread(target=run, daemon=True).start()
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+        gc.collect()
+
+MODEL_CACHE = ModelCache()
+
+# --- Splitting long audio at pauses ---
+def silence_chunks(audio, chunk_seconds=300, search_seconds=30, frame_seconds=0.03):
+    """
+    Splits 16 kHz audio into (start, end) sample ranges of about `chunk_seconds`, each cut placed
+    at the quietest moment within `search_seconds` of the target, so no chunk boundary falls in
+    the middle of a word. Loudness is the RMS of 30 ms frames smoothed over 0.3 s.
+    """
+    total = len(audio)
+    chunk = int(chunk_seconds * SAMPLE_RATE)
+    if total <= chunk: return [(0, total)]
+    frame = int(frame_seconds * SAMPLE_RATE)
+    n_frames = total // frame
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    energy = np.sqrt(np.einsum("ij,ij->i", frames, frames) / frame)  # No squared copy of the whole file
+    smooth = np.convolve(energy, np.ones(10) / 10, mode="same")
+
+    chunk_frames, search_frames = chunk // frame, int(search_seconds * SAMPLE_RATE) // frame
+    cuts = [0]
+    while total - cuts[-1] > chunk:
+        first = cuts[-1] // frame + 1
+        target = cuts[-1] // frame + chunk_frames
+        lo, hi = max(first, target - search_frames), min(n_frames - 1, target + search_frames)
+        if hi <= lo: break
+        cuts.append((lo + int(np.argmin(smooth[lo:hi + 1]))) * frame + frame // 2)
+    cuts.append(total)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+def _shifted(segment, offset):
+    """Copy of a Whisper segment moved by `offset` seconds, keeping only what the SRT needs."""
+    shifted = {'start': segment['start'] + offset, 'end': segment['end'] + offset, 'text': segment['text']}
+    if segment.get('words'):
+        shifted['words'] = [dict(w, start=w['start'] + offset, end=w['end'] + offset) for w in segment['words']]
+    return shifted
+
+# --- Workers (run in child processes) ---
+_worker_model = None
+
+def _init_worker(model_size, torch_threads):
+    """Loads the model once per worker process; later chunks reuse it."""
+    global _worker_model
+    import torch
+    torch.set_num_threads(torch_threads)  # Workers share the cores instead of each grabbing all of them
+    _worker_model = whisper.load_model(model_size)  # One model per process, nothing for MODEL_CACHE to share
+
+def _transcribe_chunk(index, samples, offset_seconds, options):
+    result = _worker_model.transcribe(samples, **options)
+    return index, [_shifted(segment, offset_seconds) for segment in result['segments']]
+
+def transcribe_parallel(audio_path, model_size, workers, chunk_seconds=300, progress=None, options=None):
+    """
+    Transcribes a long file as pause-aligned chunks on `workers` processes, each holding its own
+    model, and returns one list of segments on the file's timeline, in order.
+    `progress(done_seconds, total_seconds)` is called as chunks finish.
+    """
+    options = dict(TRANSCRIBE_OPTIONS, verbose=None, **(options or {}))  # No interleaved progress bars from the workers
+    audio = load_audio(audio_path)
+    chunks = silence_chunks(audio, chunk_seconds)
+    total_seconds = len(audio) / SAMPLE_RATE
+    workers = max(1, min(workers, len(chunks)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    results, done_seconds = {}, 0.0
+    # Spawned, never forked: a fork would copy MODEL_CACHE mid-preload (an Event no child ever sees
+    # set) and torch's thread pools from a parent that may already have run a model.
+    context = get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(model_size, threads)) as executor:
+        futures = [executor.submit(_transcribe_chunk, i, audio[start:end], start / SAMPLE_RATE, options)
+                   for i, (start, end) in enumerate(chunks)]
+        for future in as_completed(futures):
+            index, segments = future.result()
+            results[index] = segments
+            start, end = chunks[index]
+            done_seconds += (end - start) / SAMPLE_RATE
+            if progress: progress(done_seconds, total_seconds)
+    return [segment for i in range(len(chunks)) for segment in results[i]]
+
+# --- Streaming: cues on disk as each window finishes ---
+PROMPT_CHARS = 200  # Tail of the previous window's text handed to the next as context
+
+def progress_path(srt_path):
+    return srt_path + ".progress.json"
+
+def _load_progress(srt_path, key):
+    """The sidecar of an interrupted run with the same `key` (audio, model, windows, options), or None to start over."""
+    try:
+        with open(progress_path(srt_path), encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved['key'] != key: return None
+        if os.path.getsize(srt_path) < saved['srt_bytes']: return None
+        return saved
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _save_progress(srt_path, state):
+    temp_path = progress_path(srt_path) + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(temp_path, progress_path(srt_path))  # Never a half-written sidecar
+
+def transcribe_streaming(model, audio, srt_path, source=None, model_size=None, window_seconds=45, progress=None, options=None):
+    """
+    Transcribes 16 kHz `audio` in pause-aligned windows of about `window_seconds`, in order, and
+    appends each window's cues to `srt_path` (flushed and fsynced) before starting the next. The
+    tail of each window's text is passed to the next as `initial_prompt`, so wording and names
+    carry across the cut. After every window a sidecar (`<srt>.progress.json`) records how far it
+    got; a later call for the same `source`, `model_size` and options picks up from there (any
+    change starts the file over, so one SRT never mixes two models' cues), and the sidecar is
+    deleted once the file is complete. `progress(done_seconds, total_seconds)` follows the audio position.
+    Returns the number of cues written.
+    """
+    options = dict(TRANSCRIBE_OPTIONS, **(options or {}))
+    windows = silence_chunks(audio, window_seconds, search_seconds=window_seconds / 4)
+    total_seconds = len(audio) / SAMPLE_RATE
+    # Round-tripped through JSON so it compares equal to the copy read back from the sidecar.
+    key = json.loads(json.dumps({'source': source, 'model': model_size, 'samples': len(audio),
+                                 'window_seconds': window_seconds, 'options': options}, sort_keys=True))
+    state = _load_progress(srt_path, key)
+    if state:
+        os.truncate(srt_path, state['srt_bytes'])  # Drop a window that was only partly written
+    else:
+        state = {'key': key, 'windows_done': 0, 'cues': 0, 'srt_bytes': 0, 'prompt': None}
+        open(srt_path, "w").close()
+    if progress: progress(windows[state['windows_done'] - 1][1] / SAMPLE_RATE if state['windows_done'] else 0.0, total_seconds)
+
+    with open(srt_path, "ab") as srt_file:
+        for index in range(state['windows_done'], len(windows)):
+            start, end = windows[index]
+            result = model.transcribe(audio[start:end], initial_prompt=state['prompt'], **options)
+            text = []
+            for segment in result['segments']:
+                state['cues'] += 1
+                srt_file.write(format_cue(state['cues'], _shifted(segment, start / SAMPLE_RATE)).encode("utf-8"))
+                text.append(segment['text'].strip())
+            srt_file.flush()
+            os.fsync(srt_file.fileno())
+            state['prompt'] = " ".join(text)[-PROMPT_CHARS:] or state['prompt']
+            state['windows_done'], state['srt_bytes'] = index + 1, srt_file.tell()
+            _save_progress(srt_path, state)
+            if progress: progress(end / SAMPLE_RATE, total_seconds)
+    os.remove(progress_path(srt_path))
+    return state['cues']
+
+# --- Batch queue: many audio files, one shared model ---
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".flac", ".ogg", ".aac")
+
+def find_audio(folder):
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(AUDIO_EXTENSIONS))
+
+class SrtJobQueue:
+    """
+    Generates an SRT next to each queued audio file on a bounded pool of worker threads.
+    All workers share one cached model through MODEL_CACHE.using(), so only one transcription
+    runs at a time (also against the single-file generator) while the other workers decode
+    (ffmpeg) and write their files around it. Jobs are dicts {'path', 'srt_path', 'status', 'error', 'progress'} with
+    status "queued", "decoding", "waiting", "transcribing", "done" or "failed"; 'progress' is the
+    transcribed fraction. SRTs are written as they go (transcribe_streaming), so a retried or
+    re-queued file resumes where it stopped.
+    Progress goes through `messages` (a queue.Queue) for the GUI to poll with after():
+      ("status", job_index)   # jobs[job_index] changed
+      ("finished", failed_count)
+    """
+    def __init__(self):
+        self.jobs = []
+        self.messages = queue.Queue()
+        self._pending = queue.Queue()
+        self._threads = []
+        self._cancelled = threading.Event()
+
+    def add(self, paths):
+        """Queues audio files that are not queued already; returns how many were added."""
+        known = {job['path'] for job in self.jobs}
+        added = 0
+        for path in paths:
+            path = os.path.abspath(path)
+            if path in known: continue
+            known.add(path)
+            self.jobs.append({'path': path, 'srt_path': os.path.splitext(path)[0] + ".srt", 'status': "queued", 'error': None, 'progress': 0.0})
+            added += 1
+        return added
+
+    def is_running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self, model_size, workers=2):
+        """Runs every queued job. Done jobs are never redone; see retry_failed()."""
+        if self.is_running(): return
+        self._cancelled.clear()
+        self._pending = queue.Queue()
+        for index, job in enumerate(self.jobs):
+            if job['status'] == "queued":
+                self._pending.put(index)
+        self._threads = [threading.Thread(target=self._work, args=(model_size,), daemon=True) for _ in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+        threading.Thread(target=self._watch, args=(list(self._threads),), daemon=True).start()
+
+    def retry_failed(self, model_size, workers=2):
+        for job in self.jobs:
+            if job['status'] == "failed":
+                job['status'], job['error'] = "queued", None
+        self.start(model_size, workers)
+
+    def _set(self, index, status, error=None):
+        self.jobs[index]['status'], self.jobs[index]['error'] = status, error
+        self.messages.put(("status", index))
+
+    def _work(self, model_size):
+        while not self._cancelled.is_set():
+            try:
+                index = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            job = self.jobs[index]
+            def on_progress(done, total, index=index):
+                self.jobs[index]['progress'] = done / total if total else 1.0
+                self.messages.put(("status", index))
+            try:
+                self._set(index, "decoding")
+                audio = load_audio(job['path'])
+                self._set(index, "waiting")
+                with MODEL_CACHE.using(model_size) as model:
+                    self._set(index, "transcribing")
+                    transcribe_streaming(model, audio, job['srt_path'], source=job['path'], model_size=model_size, progress=on_progress)
+                self._set(index, "done")
+            except Exception as e:
+                self._set(index, "failed", str(e))
+
+    def _watch(self, threads):
+        for thread in threads:
+            thread.join()
+        self.messages.put(("finished", sum(job['status'] == "failed" for job in self.jobs)))
+
+    def poll(self):
+        """Returns every message queued since the last call without blocking."""
+        return drain(self.messages)
+
+    def cancel(self):
+        """Stops after the jobs already running; unstarted ones stay queued."""
+        self._cancelled.set()